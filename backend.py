@@ -0,0 +1,295 @@
+# backend.py
+import os
+import random
+import re
+import threading
+import time
+
+from lazy_modules import module_available
+
+DEFAULT_MODEL = os.environ.get("VLA_MODEL", "gemma3:4b")
+DEFAULT_USER_PROMPT = "Based on this image, generate robot commands for the most logical task."
+
+DEFAULT_PROMPT_TEMPLATE = """You are a Vision-Language-Action (VLA) model controlling a robot. Based on the image and the user's instruction: "{user_prompt}", generate a sequence of robot commands.
+
+Available functions:
+- go_ahead(distance_meters): Move forward by the specified distance
+- go_back(distance_meters): Move backward by the specified distance
+- turn_left(angle_degrees): Turn left by the specified angle in degrees
+- turn_right(angle_degrees): Turn right by the specified angle in degrees
+- change_speed(speed_percent): Change the robot's movement speed
+
+Provide your response as a list of function calls with appropriate parameters. For example:
+[
+    "go_ahead(1.5)",
+    "turn_left(45)",
+]
+
+Return ONLY the command list with NO explanations or additional text.
+This will be interpreted as a custom language model for robot control.
+"""
+
+
+def response_text(response):
+    if isinstance(response, dict):
+        if 'message' in response and 'content' in response['message']:
+            return response['message']['content']
+        elif 'content' in response:
+            return response['content']
+        else:
+            return str(response)
+    elif hasattr(response, 'message') and hasattr(response.message, 'content'):
+        return response.message.content or ""
+    else:
+        return response.content if hasattr(response, 'content') else str(response)
+
+
+def load_prompt_template(path=None):
+    if not path:
+        return DEFAULT_PROMPT_TEMPLATE
+    with open(path, "r") as f:
+        return f.read()
+
+
+def options_from_env():
+    options = {}
+    for key, env, cast in (("num_ctx", "VLA_NUM_CTX", int),
+                           ("num_predict", "VLA_NUM_PREDICT", int),
+                           ("temperature", "VLA_TEMPERATURE", float)):
+        value = os.environ.get(env)
+        if value:
+            options[key] = cast(value)
+    # A command list is a few dozen tokens; capping generation keeps a
+    # rambling answer from holding a model session for seconds.
+    options.setdefault("num_predict", 128)
+    return options
+
+
+class InferenceBackend:
+    name = "base"
+
+    def __init__(self, model=DEFAULT_MODEL, prompt_template=DEFAULT_PROMPT_TEMPLATE):
+        self.model = model
+        self.prompt_template = prompt_template
+        self.warm = {}
+
+    @classmethod
+    def from_env(cls):
+        raise NotImplementedError
+
+    def build_prompt(self, user_prompt, context=None):
+        # str.replace rather than format() so templates may contain braces.
+        # context is sensor information such as obstacle distances.
+        prompt = self.prompt_template.replace("{user_prompt}", user_prompt or DEFAULT_USER_PROMPT)
+        if context:
+            prompt = f"{prompt.rstrip()}\n\nSensor readings at the time of the image:\n{context}\n"
+        return prompt
+
+    def chat(self, image, user_prompt, model=None, context=None):
+        raise NotImplementedError
+
+    def stream(self, image, user_prompt, model=None, context=None):
+        yield self.chat(image, user_prompt, model, context)
+
+    def warm_up(self, model=None):
+        return 0.0
+
+    def warm_up_async(self, model=None):
+        def run():
+            try:
+                elapsed = self.warm_up(model)
+                print(f"Model {model or self.model} loaded in {elapsed:.1f}s")
+            except Exception as e:
+                print(f"Model warm-up failed: {e}")
+
+        thread = threading.Thread(target=run, name="vla-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "model": self.model,
+            "warm_up_seconds": {model: round(t, 3) for model, t in self.warm.items()},
+        }
+
+
+class OllamaBackend(InferenceBackend):
+    name = "ollama"
+
+    def __init__(self, host=None, model=DEFAULT_MODEL, keep_alive="30m", options=None,
+                 prompt_template=DEFAULT_PROMPT_TEMPLATE, timeout=120.0):
+        if not module_available("ollama"):
+            raise ImportError("The ollama backend needs the ollama package: pip install ollama")
+        super().__init__(model, prompt_template)
+        self.host = host
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.options = options or {}
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        # One client per process: it owns an HTTP connection pool, so
+        # requests reuse connections instead of reconnecting every time.
+        # The ollama package takes a few hundred milliseconds to import, so
+        # that happens on the first call (or the warm-up thread), not at
+        # startup.
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import ollama
+                    self._client = ollama.Client(host=self.host, timeout=self.timeout)
+        return self._client
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            host=os.environ.get("OLLAMA_HOST"),
+            model=DEFAULT_MODEL,
+            keep_alive=os.environ.get("VLA_KEEP_ALIVE", "30m"),
+            options=options_from_env(),
+            prompt_template=load_prompt_template(os.environ.get("VLA_PROMPT_TEMPLATE")),
+            timeout=float(os.environ.get("VLA_MODEL_TIMEOUT", 120)),
+        )
+
+    def _chat(self, image, user_prompt, model, context, stream):
+        return self.client.chat(
+            model=model or self.model,
+            messages=[
+                {
+                    'role': 'user',
+                    'content': self.build_prompt(user_prompt, context),
+                    'images': [image]
+                }
+            ],
+            options=self.options,
+            keep_alive=self.keep_alive,
+            stream=stream,
+        )
+
+    def chat(self, image, user_prompt, model=None, context=None):
+        return response_text(self._chat(image, user_prompt, model, context, stream=False))
+
+    def stream(self, image, user_prompt, model=None, context=None):
+        for chunk in self._chat(image, user_prompt, model, context, stream=True):
+            text = response_text(chunk)
+            if text:
+                yield text
+
+    def warm_up(self, model=None):
+        # An empty generate request loads the model and pins it in memory
+        # for keep_alive without producing any tokens.
+        model = model or self.model
+        start = time.perf_counter()
+        self.client.generate(model=model, prompt="", keep_alive=self.keep_alive)
+        elapsed = time.perf_counter() - start
+        self.warm[model] = elapsed
+        return elapsed
+
+    def stats(self):
+        stats = super().stats()
+        stats["keep_alive"] = self.keep_alive
+        stats["options"] = self.options
+        return stats
+
+
+class StubBackend(InferenceBackend):
+    # Deterministic stand-in for load testing without a model: answers after
+    # a configurable latency with either a canned response or commands
+    # derived from keywords in the instruction.
+    name = "stub"
+
+    RULES = (
+        (re.compile(r"\b(left)\b"), "turn_left({angle:g})"),
+        (re.compile(r"\b(right)\b"), "turn_right({angle:g})"),
+        (re.compile(r"\b(back|backward|reverse)\b"), "go_back({distance:g})"),
+        (re.compile(r"\b(fast|faster|hurry)\b"), "change_speed(80)"),
+        (re.compile(r"\b(slow|slower|careful)\b"), "change_speed(30)"),
+        (re.compile(r"\b(forward|ahead|straight|go)\b(?!\s+back)"), "go_ahead({distance:g})"),
+    )
+    NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+    def __init__(self, model="stub", latency=0.5, jitter=0.0, response=None, seed=0,
+                 prompt_template=DEFAULT_PROMPT_TEMPLATE):
+        super().__init__(model, prompt_template)
+        self.latency = latency
+        self.jitter = jitter
+        self.response = response
+        self.seed = seed
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            model=os.environ.get("VLA_MODEL", "stub"),
+            latency=float(os.environ.get("VLA_STUB_LATENCY", 0.5)),
+            jitter=float(os.environ.get("VLA_STUB_JITTER", 0.0)),
+            response=os.environ.get("VLA_STUB_RESPONSE"),
+            seed=int(os.environ.get("VLA_STUB_SEED", 0)),
+        )
+
+    def plan(self, user_prompt):
+        if self.response is not None:
+            return self.response
+
+        text = (user_prompt or "").lower()
+
+        # Commands follow the order in which their keywords appear; a number
+        # shortly after a keyword becomes its argument.
+        found = []
+        for pattern, template in self.RULES:
+            match = pattern.search(text)
+            if match:
+                number = self.NUMBER_RE.search(text, match.end(), match.end() + 16)
+                value = float(number.group(0)) if number else None
+                distance = value if value is not None and value <= 5 else 1.0
+                angle = value if value is not None and value <= 360 else 90.0
+                found.append((match.start(), template.format(distance=distance, angle=angle)))
+        commands = [command for _, command in sorted(found)] or ["go_ahead(0.5)"]
+        return "[\n" + "".join(f'    "{c}",\n' for c in commands) + "]"
+
+    def delay(self, user_prompt):
+        # Same prompt and seed always give the same latency.
+        if not self.jitter:
+            return self.latency
+        rng = random.Random(f"{self.seed}:{user_prompt}")
+        return max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter))
+
+    def chat(self, image, user_prompt, model=None, context=None):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay(user_prompt))
+        return self.plan(user_prompt)
+
+    def stream(self, image, user_prompt, model=None, context=None):
+        with self.lock:
+            self.calls += 1
+        text = self.plan(user_prompt)
+        chunks = re.findall(r".{1,8}", text, re.DOTALL)
+        pause = self.delay(user_prompt) / max(len(chunks), 1)
+        for chunk in chunks:
+            time.sleep(pause)
+            yield chunk
+
+    def stats(self):
+        stats = super().stats()
+        stats["latency"] = self.latency
+        stats["jitter"] = self.jitter
+        stats["calls"] = self.calls
+        return stats
+
+
+BACKENDS = {
+    "ollama": OllamaBackend,
+    "stub": StubBackend,
+}
+
+
+def create_backend(name=None):
+    name = (name or os.environ.get("VLA_BACKEND", "ollama")).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name].from_env()
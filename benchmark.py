@@ -0,0 +1,505 @@
+# benchmark.py
+import argparse
+import base64
+import contextlib
+import io
+import json
+import logging
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from frame_encoder import HAS_NUMPY, HAS_PIL, encode_frame, extension_for
+from fake_robot import synthetic_frame
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile of an already sorted list.
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(seconds):
+    values = sorted(seconds)
+    if not values:
+        return {"count": 0}
+    mean = sum(values) / len(values)
+    stdev = math.sqrt(sum((v - mean) ** 2 for v in values) / len(values))
+    return {
+        "count": len(values),
+        "mean_ms": round(mean * 1000, 3),
+        "stdev_ms": round(stdev * 1000, 3),
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3),
+    }
+
+
+def legacy_capture(image, width, height, image_path):
+    # Per-pixel writer that capture_image used before frame_encoder existed,
+    # kept here as the baseline for comparison.
+    with open(f"{image_path}.bmp", "wb") as f:
+        f.write(bytes([ord('B'), ord('M')]))
+        size = 54 + 3 * width * height
+        f.write(size.to_bytes(4, byteorder='little'))
+        f.write(bytes([0, 0, 0, 0]))
+        f.write((54).to_bytes(4, byteorder='little'))
+        f.write((40).to_bytes(4, byteorder='little'))
+        f.write(width.to_bytes(4, byteorder='little'))
+        f.write(height.to_bytes(4, byteorder='little'))
+        f.write((1).to_bytes(2, byteorder='little'))
+        f.write((24).to_bytes(2, byteorder='little'))
+        for _ in range(6):
+            f.write(bytes([0, 0, 0, 0]))
+
+        for y in range(height - 1, -1, -1):
+            for x in range(width):
+                idx = (y * width + x) * 4
+                b = int(image[idx + 2])
+                g = int(image[idx + 1])
+                r = int(image[idx])
+                f.write(bytes([b, g, r]))
+
+            padding_len = (4 - (width * 3) % 4) % 4
+            f.write(bytes([0] * padding_len))
+
+    try:
+        from PIL import Image
+        img = Image.open(f"{image_path}.bmp")
+        img.save(image_path)
+        os.remove(f"{image_path}.bmp")
+    except ImportError:
+        image_path = f"{image_path}.bmp"
+
+    return image_path
+
+
+def encoder_capture(image, width, height, image_path, fmt="JPEG"):
+    data, fmt = encode_frame(image, width, height, fmt)
+    image_path = image_path + extension_for(fmt)
+    with open(image_path, "wb") as f:
+        f.write(data)
+    return image_path
+
+
+def measure(label, capture, frames, image, width, height, workdir):
+    paths = set()
+    start = time.perf_counter()
+    for i in range(frames):
+        paths.add(capture(image, width, height, os.path.join(workdir, f"{label}_{i}.jpg")))
+    elapsed = time.perf_counter() - start
+    for path in paths:
+        os.remove(path)
+    return {
+        "frames": frames,
+        "seconds": round(elapsed, 4),
+        "fps": round(frames / elapsed, 2) if elapsed else None,
+        "ms_per_frame": round(elapsed * 1000 / frames, 3),
+    }
+
+
+def bench_capture(args):
+    image = synthetic_frame(args.width, args.height)
+    results = {
+        "width": args.width,
+        "height": args.height,
+        "numpy": HAS_NUMPY,
+        "pil": HAS_PIL,
+    }
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.legacy_frames > 0:
+            results["legacy"] = measure("legacy", legacy_capture, args.legacy_frames,
+                                        image, args.width, args.height, workdir)
+        results["encoder_jpeg"] = measure("jpeg", encoder_capture, args.frames,
+                                          image, args.width, args.height, workdir)
+        results["encoder_bmp"] = measure(
+            "bmp", lambda *a: encoder_capture(*a, fmt="BMP"), args.frames,
+            image, args.width, args.height, workdir)
+
+    if "legacy" in results:
+        legacy_fps = results["legacy"]["fps"]
+        for key in ("encoder_jpeg", "encoder_bmp"):
+            results[key]["speedup"] = round(results[key]["fps"] / legacy_fps, 1)
+
+    return results
+
+
+def bench_ipc(args):
+    from command_channel import CommandServer, CommandClient
+
+    server = CommandServer("127.0.0.1", 0)
+    running = threading.Event()
+    running.set()
+    received = []
+
+    def poll_loop():
+        # Stands in for the controller, which polls once per control step.
+        while running.is_set():
+            received.extend(server.poll())
+            time.sleep(args.poll_ms / 1000.0)
+
+    poller = threading.Thread(target=poll_loop, daemon=True)
+    poller.start()
+    client = CommandClient(*server.address)
+    commands = [{"name": "go_ahead", "value": 0.5}, {"name": "turn_left", "value": 90}]
+
+    latencies = []
+    try:
+        for _ in range(args.messages):
+            start = time.perf_counter()
+            client.send(commands)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        client.close()
+        running.clear()
+        poller.join()
+        server.close()
+
+    return {
+        "messages": args.messages,
+        "received": len(received),
+        "poll_ms": args.poll_ms,
+        "round_trip": summarize(latencies),
+    }
+
+
+def bench_server(args):
+    # Env must be set before main is imported: it builds its backend, cache
+    # and scheduler at import time.
+    os.environ["VLA_BACKEND"] = "stub"
+    os.environ["VLA_STUB_LATENCY"] = str(args.latency)
+    os.environ["VLA_STUB_JITTER"] = str(args.jitter)
+    os.environ["VLA_MODEL_SESSIONS"] = str(args.sessions)
+    if not args.cache:
+        os.environ["VLA_CACHE_SIZE"] = "0"
+
+    from werkzeug.serving import make_server
+    import main as vla_server
+
+    image, fmt = encode_frame(synthetic_frame(args.width, args.height), args.width, args.height)
+    image_base64 = base64.b64encode(image).decode("ascii")
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    httpd = make_server("127.0.0.1", 0, vla_server.app, threaded=True)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    path = "/process-image/stream" if args.stream else "/process-image"
+    url = f"http://127.0.0.1:{httpd.server_port}{path}"
+
+    def one_request(i):
+        body = json.dumps({
+            "image_base64": image_base64,
+            "user_prompt": f"go forward {i % 5 + 1} then turn left",
+            "robot_id": f"robot-{i % args.robots}",
+        }).encode()
+        req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+        start = time.perf_counter()
+        first_command = None
+        try:
+            with urllib.request.urlopen(req, timeout=60) as response:
+                status = response.status
+                if args.stream:
+                    for line in response:
+                        if first_command is None and json.loads(line).get("type") == "command":
+                            first_command = time.perf_counter() - start
+                else:
+                    response.read()
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except OSError:
+            status = "error"
+        return status, time.perf_counter() - start, first_command
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            outcomes = list(pool.map(one_request, range(args.requests)))
+    finally:
+        elapsed = time.perf_counter() - start
+        httpd.shutdown()
+
+    statuses = {}
+    for status, _, _ in outcomes:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    results = {
+        "endpoint": path,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "robots": args.robots,
+        "image_bytes": len(image),
+        "image_format": fmt,
+        "stub_latency": args.latency,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(args.requests / elapsed, 2) if elapsed else None,
+        "statuses": statuses,
+        "latency": summarize([t for status, t, _ in outcomes if status == 200]),
+        "scheduler": vla_server.scheduler.stats(),
+        "cache": vla_server.inference_cache.stats(),
+    }
+    if args.stream:
+        results["first_command"] = summarize([f for _, _, f in outcomes if f is not None])
+    return results
+
+
+def bench_controller(args):
+    import fake_robot
+
+    fake_robot.install()
+    fake_robot.Robot.max_steps = args.steps
+    fake_robot.Robot.camera_size = (args.width, args.height)
+
+    step_times = []
+    period = None
+
+    def clock(robot):
+        now = time.perf_counter()
+        if not args.fast:
+            # Pace the simulation like Webots in real-time mode so the
+            # measured intervals show jitter rather than raw overhead.
+            target = step_times[0] + robot.steps * period if step_times else now
+            if target > now:
+                time.sleep(target - now)
+                now = time.perf_counter()
+        step_times.append(now)
+
+    fake_robot.Robot.clock = staticmethod(clock)
+
+    import rosbot
+    from command_channel import CommandClient, ChannelError
+
+    period = rosbot.TIME_STEP / 1000.0
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        controller = rosbot.ROSbotController()
+    motor = controller.front_left_motor
+    sent = {}
+
+    def send_commands():
+        while controller.robot.steps < args.command_step:
+            time.sleep(0.001)
+        client = CommandClient(*controller.command_server.address)
+        try:
+            sent["start"] = time.perf_counter()
+            client.send(args.commands)
+            sent["ack_seconds"] = time.perf_counter() - sent["start"]
+        except ChannelError as e:
+            sent["error"] = str(e)
+        finally:
+            client.close()
+
+    sender = threading.Thread(target=send_commands, daemon=True)
+    sender.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(log):
+        controller.run()
+    wall = time.perf_counter() - start
+    sender.join(timeout=5)
+
+    intervals = [b - a for a, b in zip(step_times, step_times[1:])]
+    sim_seconds = controller.robot.getTime()
+    capture = controller.capture_scheduler.stats()
+    x, y, theta = controller.robot.pose
+
+    results = {
+        "steps": controller.robot.steps,
+        "realtime": not args.fast,
+        "sim_seconds": round(sim_seconds, 3),
+        "wall_seconds": round(wall, 3),
+        "realtime_factor": round(sim_seconds / wall, 2) if wall else None,
+        # Sleep granularity alone puts steps a little over budget; only
+        # count steps that ran more than 10% late.
+        "loop": dict(summarize(intervals), budget_ms=rosbot.TIME_STEP,
+                     overruns=sum(1 for i in intervals if i > period * 1.1)),
+        "capture": dict(capture, width=args.width, height=args.height,
+                        fps_sim=round(capture["published"] / sim_seconds, 2) if sim_seconds else None,
+                        fps_wall=round(capture["published"] / wall, 2) if wall else None),
+        "commands": {
+            "sent": args.commands,
+            "ack_ms": round(sent["ack_seconds"] * 1000, 3) if "ack_seconds" in sent else None,
+            "to_motion_ms": (round((motor.first_motion - sent["start"]) * 1000, 3)
+                             if motor.first_motion and "start" in sent else None),
+            "left_in_queue": len(controller.command_queue),
+            "error": sent.get("error"),
+        },
+        "final_pose": [round(x, 3), round(y, 3), round(math.degrees(theta), 1)],
+    }
+    return results
+
+
+STARTUP_IMPORTS = {
+    "main": "import main",
+    "gui": "import gui",
+    # rosbot needs a `controller` module to import.
+    "rosbot": "import fake_robot; fake_robot.install(); import rosbot",
+}
+
+# Dependencies that should only be imported when first used.
+LAZY_DEPENDENCIES = ("numpy", "PIL.Image", "ollama", "requests")
+
+
+def parse_importtime(text):
+    # `-X importtime` prints "import time: self | cumulative | name" per
+    # module in microseconds, children before their parent and indented
+    # by two spaces per level.
+    entries = []
+    for line in text.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return entries
+
+
+def import_breakdown(entries, module, top):
+    # Cumulative import time of `module` and of its direct imports.
+    for i, (name, depth, _, cumulative) in enumerate(entries):
+        if name == module and depth == 0:
+            break
+    else:
+        return None
+    first = i
+    while first > 0 and entries[first - 1][1] > 0:
+        first -= 1
+    children = sorted((e for e in entries[first:i] if e[1] == 1), key=lambda e: e[3], reverse=True)
+    return {
+        "import_us": cumulative,
+        "modules": i - first + 1,
+        "heaviest": {name: round(us / 1000, 2) for name, _, _, us in children[:top]},
+        "loaded": [dep for dep in LAZY_DEPENDENCIES if any(e[0] == dep for e in entries[first:i])],
+    }
+
+
+def bench_startup(args):
+    # Every run is a fresh interpreter, as when a process is restarted.
+    cwd = os.path.dirname(os.path.abspath(__file__))
+
+    def run(code):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                              capture_output=True, text=True, cwd=cwd)
+        return proc, time.perf_counter() - start
+
+    baseline = sorted(run("pass")[1] for _ in range(args.runs))
+    results = {"runs": args.runs, "interpreter_ms": round(percentile(baseline, 50) * 1000, 1)}
+    for module in args.modules:
+        walls, imports, breakdown = [], [], None
+        for _ in range(args.runs):
+            proc, wall = run(STARTUP_IMPORTS.get(module, f"import {module}"))
+            if proc.returncode != 0:
+                breakdown = {"error": proc.stderr.strip().splitlines()[-1]}
+                break
+            breakdown = import_breakdown(parse_importtime(proc.stderr), module, args.top)
+            walls.append(wall)
+            imports.append(breakdown["import_us"] / 1e6)
+        if walls:
+            breakdown.pop("import_us")
+            breakdown = dict(breakdown, import_ms=round(percentile(sorted(imports), 50) * 1000, 1),
+                             process_ms=round(percentile(sorted(walls), 50) * 1000, 1))
+        results[module] = breakdown
+    return results
+
+
+def environment():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                  text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        revision = ""
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "revision": revision or None,
+        "numpy": HAS_NUMPY,
+        "pil": HAS_PIL,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ROSbot VLA performance benchmarks")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    capture = subparsers.add_parser("capture", help="Frame capture and encoding throughput")
+    capture.add_argument("--width", type=int, default=640)
+    capture.add_argument("--height", type=int, default=480)
+    capture.add_argument("--frames", type=int, default=100)
+    capture.add_argument("--legacy-frames", type=int, default=3)
+    capture.set_defaults(func=bench_capture)
+
+    ipc = subparsers.add_parser("ipc", help="Command channel round-trip latency")
+    ipc.add_argument("--messages", type=int, default=500)
+    ipc.add_argument("--poll-ms", type=float, default=1.0)
+    ipc.set_defaults(func=bench_ipc)
+
+    server = subparsers.add_parser("server", help="/process-image throughput against the stub backend")
+    server.add_argument("--requests", type=int, default=200)
+    server.add_argument("--concurrency", type=int, default=8)
+    server.add_argument("--robots", type=int, default=4)
+    server.add_argument("--latency", type=float, default=0.05, help="Stub model latency in seconds")
+    server.add_argument("--jitter", type=float, default=0.0)
+    server.add_argument("--sessions", type=int, default=2)
+    server.add_argument("--width", type=int, default=640)
+    server.add_argument("--height", type=int, default=480)
+    server.add_argument("--stream", action="store_true", help="Use /process-image/stream")
+    server.add_argument("--cache", action="store_true", help="Keep the inference cache enabled")
+    server.set_defaults(func=bench_server)
+
+    controller = subparsers.add_parser("controller", help="Control loop jitter and capture rate on a simulated robot")
+    controller.add_argument("--steps", type=int, default=300)
+    controller.add_argument("--width", type=int, default=640)
+    controller.add_argument("--height", type=int, default=480)
+    controller.add_argument("--fast", action="store_true",
+                            help="Step as fast as possible instead of pacing steps at TIME_STEP")
+    controller.add_argument("--command-step", type=int, default=50)
+    controller.add_argument("--commands", default="go_ahead(0.5), turn_left(90), go_ahead(0.3)")
+    controller.set_defaults(func=bench_controller)
+
+    startup = subparsers.add_parser("startup", help="Import time of the server, GUI and controller")
+    startup.add_argument("--runs", type=int, default=5)
+    startup.add_argument("--top", type=int, default=8, help="Number of direct imports to list")
+    startup.add_argument("--modules", nargs="+", default=list(STARTUP_IMPORTS))
+    startup.set_defaults(func=bench_startup)
+
+    subparsers.add_parser("all", help="Run every benchmark with default settings")
+
+    args = parser.parse_args()
+
+    # Keep benchmark runs away from a controller or server that may be
+    # running on this machine.
+    os.environ.setdefault("ROSBOT_COMMAND_PORT", "0")
+    os.environ.setdefault("ROSBOT_FRAME_RING", f"rosbot_bench_{os.getpid()}")
+
+    if args.benchmark == "all":
+        names = [name for name in subparsers.choices if name != "all"]
+    else:
+        names = [args.benchmark]
+
+    results = {"environment": environment()}
+    for name in names:
+        bench_args = args if name == args.benchmark else parser.parse_args([name])
+        results[name] = bench_args.func(bench_args)
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# capture_scheduler.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class LatencyStat:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+            "last_ms": round(self.last * 1000, 3),
+        }
+
+
+class CaptureScheduler:
+    def __init__(self, grab, encode, store, target_fps=10.0, max_workers=2):
+        # grab() runs on the control thread because the Webots device API is
+        # not thread-safe. encode(*grabbed) runs on a worker thread and
+        # store(encoded) publishes the result, one frame at a time and only
+        # if no newer frame has been published already.
+        self.grab = grab
+        self.encode = encode
+        self.store = store
+        self.interval = 1.0 / target_fps if target_fps > 0 else 0.0
+        self.max_workers = max_workers
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="capture")
+        self.lock = threading.Lock()
+        self.store_lock = threading.Lock()
+        self.in_flight = 0
+        self.next_capture = 0.0
+        self.capture_id = 0
+        self.published_id = 0
+        self.last_result = None
+
+        self.capture_latency = LatencyStat()
+        self.encode_latency = LatencyStat()
+        self.dropped_busy = 0
+        self.dropped_stale = 0
+        self.errors = 0
+
+    def tick(self, now):
+        if now < self.next_capture:
+            return False
+        self.next_capture = max(self.next_capture + self.interval, now)
+
+        with self.lock:
+            if self.in_flight >= self.max_workers:
+                # Every worker is still encoding an older frame; queueing
+                # this one would only add latency, so skip it.
+                self.dropped_busy += 1
+                return False
+            self.in_flight += 1
+
+        start = time.perf_counter()
+        try:
+            grabbed = self.grab()
+        except Exception as e:
+            # A failed grab costs one frame, not the control loop.
+            with self.lock:
+                self.in_flight -= 1
+                self.errors += 1
+            print(f"Error capturing frame: {e}")
+            return False
+        self.capture_latency.add(time.perf_counter() - start)
+
+        self.capture_id += 1
+        self.executor.submit(self._encode, self.capture_id, grabbed)
+        return True
+
+    def _encode(self, capture_id, grabbed):
+        start = time.perf_counter()
+        try:
+            encoded = self.encode(*grabbed)
+            with self.store_lock:
+                if capture_id < self.published_id:
+                    stale = True
+                else:
+                    stale = False
+                    result = self.store(encoded)
+                    self.published_id = capture_id
+        except Exception as e:
+            with self.lock:
+                self.in_flight -= 1
+                self.errors += 1
+            print(f"Error encoding frame: {e}")
+            return
+
+        with self.lock:
+            self.in_flight -= 1
+            if stale:
+                self.dropped_stale += 1
+            else:
+                self.last_result = result
+                self.encode_latency.add(time.perf_counter() - start)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "captured": self.capture_id,
+                "published": self.encode_latency.count,
+                "in_flight": self.in_flight,
+                "dropped_busy": self.dropped_busy,
+                "dropped_stale": self.dropped_stale,
+                "errors": self.errors,
+                "capture": self.capture_latency.as_dict(),
+                "encode": self.encode_latency.as_dict(),
+            }
+
+    def close(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,209 @@
+# command_channel.py
+import json
+import os
+import selectors
+import socket
+import struct
+import threading
+import time
+import uuid
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = int(os.environ.get("ROSBOT_COMMAND_PORT", 5005))
+
+LENGTH = struct.Struct("!I")
+MAX_MESSAGE_SIZE = 1024 * 1024
+
+
+class ChannelError(Exception):
+    pass
+
+
+def encode_message(message):
+    payload = json.dumps(message).encode("utf-8")
+    return LENGTH.pack(len(payload)) + payload
+
+
+def recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ChannelError("Connection closed by peer")
+        data.extend(chunk)
+    return bytes(data)
+
+
+def recv_message(sock):
+    (size,) = LENGTH.unpack(recv_exact(sock, LENGTH.size))
+    if size > MAX_MESSAGE_SIZE:
+        raise ChannelError(f"Message of {size} bytes exceeds limit")
+    return json.loads(recv_exact(sock, size))
+
+
+class CommandServer:
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, status=None):
+        # status() is added to every ack, so clients can see the robot's
+        # queue without a separate request. It runs inside poll().
+        self.status = status
+        self.selector = selectors.DefaultSelector()
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((host, port))
+        self.listener.listen()
+        self.listener.setblocking(False)
+        self.selector.register(self.listener, selectors.EVENT_READ)
+
+        self.address = self.listener.getsockname()
+        self.buffers = {}
+        self.last_seq = {}
+
+    def poll(self):
+        # Never blocks: one select() with a zero timeout per control step.
+        messages = []
+        for key, _ in self.selector.select(timeout=0):
+            if key.fileobj is self.listener:
+                self._accept()
+            else:
+                self._read(key.fileobj, messages)
+        return messages
+
+    def _accept(self):
+        try:
+            conn, _ = self.listener.accept()
+        except BlockingIOError:
+            return
+        conn.setblocking(False)
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.buffers[conn] = bytearray()
+        self.selector.register(conn, selectors.EVENT_READ)
+
+    def _read(self, conn, messages):
+        try:
+            data = conn.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+
+        if not data:
+            self._close(conn)
+            return
+
+        buffer = self.buffers[conn]
+        buffer.extend(data)
+        while len(buffer) >= LENGTH.size:
+            (size,) = LENGTH.unpack_from(buffer)
+            if size > MAX_MESSAGE_SIZE:
+                print(f"Dropping command connection: message of {size} bytes exceeds limit")
+                self._close(conn)
+                return
+            if len(buffer) < LENGTH.size + size:
+                break
+            payload = bytes(buffer[LENGTH.size:LENGTH.size + size])
+            del buffer[:LENGTH.size + size]
+            self._handle(conn, payload, messages)
+
+    def _handle(self, conn, payload, messages):
+        try:
+            message = json.loads(payload)
+            seq = message["seq"]
+            client = message.get("client")
+            if not isinstance(seq, int) or isinstance(seq, bool):
+                raise TypeError("seq must be an integer")
+            if client is not None and not isinstance(client, str):
+                raise TypeError("client must be a string")
+        except (ValueError, KeyError, TypeError) as e:
+            self._reply(conn, {"ok": False, "error": f"Invalid message: {e}"})
+            return
+
+        # A client that resends after a lost ack must not run a batch twice.
+        if client is not None and seq <= self.last_seq.get(client, 0):
+            self._reply(conn, {"seq": seq, "ok": True, "duplicate": True})
+            return
+        if client is not None:
+            self.last_seq[client] = seq
+
+        messages.append(message)
+        reply = {"seq": seq, "ok": True}
+        if self.status is not None:
+            reply["status"] = self.status()
+        self._reply(conn, reply)
+
+    def _reply(self, conn, message):
+        try:
+            conn.sendall(encode_message(message))
+        except OSError:
+            self._close(conn)
+
+    def _close(self, conn):
+        self.buffers.pop(conn, None)
+        try:
+            self.selector.unregister(conn)
+        except (KeyError, ValueError):
+            pass
+        conn.close()
+
+    def close(self):
+        for conn in list(self.buffers):
+            self._close(conn)
+        self.selector.unregister(self.listener)
+        self.listener.close()
+        self.selector.close()
+
+
+class CommandClient:
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=2.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.client_id = uuid.uuid4().hex
+        self.seq = 0
+        self.sock = None
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = sock
+
+    def send(self, commands, **fields):
+        # `sent` lets the controller measure how long delivery and pickup took.
+        return self._request(dict(fields, commands=commands, sent=time.time()))
+
+    def status(self):
+        # A message without commands only fetches the controller's status.
+        return self._request({"type": "status"}).get("status", {})
+
+    def _request(self, message):
+        with self.lock:
+            self.seq += 1
+            data = encode_message(dict(message, seq=self.seq, client=self.client_id))
+
+            for attempt in range(2):
+                try:
+                    if self.sock is None:
+                        self._connect()
+                    self.sock.sendall(data)
+                    ack = recv_message(self.sock)
+                    break
+                except (OSError, ChannelError) as e:
+                    self.close_socket()
+                    if attempt:
+                        raise ChannelError(f"Could not deliver commands to {self.host}:{self.port}: {e}")
+
+            if not ack.get("ok"):
+                raise ChannelError(ack.get("error", "Command rejected"))
+            return ack
+
+    def close_socket(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def close(self):
+        with self.lock:
+            self.close_socket()
@@ -0,0 +1,150 @@
+# commands.py
+import re
+from collections import namedtuple
+
+# name -> (minimum, maximum) for the single numeric argument
+COMMAND_SPECS = {
+    "go_ahead": (0.0, 5.0),
+    "go_back": (0.0, 5.0),
+    "turn_left": (0.0, 360.0),
+    "turn_right": (0.0, 360.0),
+    "change_speed": (1.0, 100.0),
+}
+
+FENCE_RE = re.compile(r"```[a-zA-Z]*\s*(.*?)```", re.DOTALL)
+CALL_RE = re.compile(r"\b([A-Za-z_]\w*)\(([^()]*)\)")
+NUMBER_RE = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+
+class Command(namedtuple("Command", ["name", "value"])):
+    __slots__ = ()
+
+    def __str__(self):
+        return f"{self.name}({self.value:g})"
+
+    def to_dict(self):
+        return {"name": self.name, "value": self.value}
+
+
+ParseError = namedtuple("ParseError", ["position", "text", "message"])
+
+
+def validate_command(name, value, text, position=0):
+    if name not in COMMAND_SPECS:
+        return None, ParseError(position, text, f"Unknown command '{name}'")
+
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None, ParseError(position, text, f"{name} expects a number, got {value!r}")
+
+    low, high = COMMAND_SPECS[name]
+    if not low <= value <= high:
+        return None, ParseError(position, text, f"{name} argument {value:g} is outside [{low:g}, {high:g}]")
+
+    return Command(name, value), None
+
+
+def parse_call(name, args, text, position=0):
+    args = args.strip().strip("\"'").strip()
+    if not NUMBER_RE.fullmatch(args):
+        return None, ParseError(position, text, f"{name} expects a single numeric argument, got '{args}'")
+    return validate_command(name, args, text, position)
+
+
+def strip_fences(text):
+    blocks = FENCE_RE.findall(text)
+    return "\n".join(blocks) if blocks else text
+
+
+def parse_commands(text):
+    # Accepts Python- or JSON-style lists, one call per line, or either of
+    # those inside a fenced code block. Returns (commands, errors).
+    commands = []
+    errors = []
+    for match in CALL_RE.finditer(strip_fences(text)):
+        command, error = parse_call(match.group(1), match.group(2), match.group(0), match.start())
+        if error:
+            errors.append(error)
+        else:
+            commands.append(command)
+
+    if not commands and not errors:
+        errors.append(ParseError(0, text[:80], "No commands found"))
+    return commands, errors
+
+
+def load_commands(data):
+    # Command batches arrive either as the parsed list produced by the VLA
+    # server or as raw model text from older clients.
+    if isinstance(data, str):
+        return parse_commands(data)
+
+    commands = []
+    errors = []
+    for position, item in enumerate(data):
+        if isinstance(item, dict):
+            command, error = validate_command(item.get("name"), item.get("value"), str(item), position)
+        else:
+            match = CALL_RE.fullmatch(str(item).strip().strip("\"'"))
+            if match:
+                command, error = parse_call(match.group(1), match.group(2), match.group(0), position)
+            else:
+                command, error = None, ParseError(position, str(item), "Not a command call")
+        if error:
+            errors.append(error)
+        else:
+            commands.append(command)
+    return commands, errors
+
+
+class CommandStream:
+    # Incremental parser for streamed model output: each command is
+    # returned as soon as its closing parenthesis has arrived.
+    MAX_PENDING = 256
+
+    def __init__(self):
+        self.buffer = ""
+        self.text = []
+        self.offset = 0
+        self.count = 0
+        self.errors = 0
+
+    def feed(self, chunk):
+        self.text.append(chunk)
+        self.buffer += chunk
+
+        results = []
+        end = 0
+        for match in CALL_RE.finditer(self.buffer):
+            command, error = parse_call(match.group(1), match.group(2), match.group(0),
+                                        self.offset + match.start())
+            if error:
+                self.errors += 1
+                results.append(error)
+            else:
+                self.count += 1
+                results.append(command)
+            end = match.end()
+
+        # Keep only what could still become part of a call: the last open
+        # parenthesis, or trailing name characters, plus the name before it.
+        rest = self.buffer[end:]
+        start = rest.rfind("(")
+        if start < 0:
+            start = len(rest)
+        while start > 0 and (rest[start - 1].isalnum() or rest[start - 1] == "_"):
+            start -= 1
+        start = max(start, len(rest) - self.MAX_PENDING)
+        self.offset += end + start
+        self.buffer = rest[start:]
+        return results
+
+    def finish(self):
+        if not self.count and not self.errors:
+            return [ParseError(0, self.raw[:80], "No commands found")]
+        return []
+
+    @property
+    def raw(self):
+        return "".join(self.text)
@@ -0,0 +1,178 @@
+# continuous.py
+# Continuous mode for standing instructions such as "follow the corridor".
+# While the robot executes one batch the planner already runs the model on
+# the latest frame and parks the result on the controller as a standby
+# plan, which the controller starts the moment its queue drains. A standby
+# plan whose frame no longer looks like the current scene is withdrawn and
+# planned again.
+import threading
+import time
+
+from inference_cache import hamming_distance
+
+
+class ContinuousPlanner:
+    def __init__(self, capture, plan, dispatch, controller_status, interval=0.2, max_distance=10,
+                 retry_delay=1.0):
+        # capture(session) returns a plan request for the latest frame, or
+        # None; its image_key is the frame's perceptual hash. plan(request)
+        # returns a list of commands, or None if planning failed.
+        # dispatch(commands, mode, trace_id) sends to the controller and
+        # controller_status() asks for its queue and standby state; both
+        # raise on delivery errors.
+        self.capture = capture
+        self.plan = plan
+        self.dispatch = dispatch
+        self.controller_status = controller_status
+        self.interval = interval
+        self.max_distance = max_distance
+        self.retry_delay = retry_delay
+
+        self.lock = threading.Lock()
+        self.session = None
+        self.stop_event = None
+        self.thread = None
+        # (trace id, image key) of the plan parked on the controller
+        self.standby = None
+        self.last_error = None
+
+        self.plans = 0
+        self.started_idle = 0
+        self.standby_sent = 0
+        self.standby_used = 0
+        self.discarded_stale = 0
+        self.errors = 0
+
+    @property
+    def active(self):
+        return self.session is not None
+
+    def start(self, session):
+        # session holds the request fields (user_prompt, robot_id, ...)
+        # used for every plan. Replaces a running session.
+        with self.lock:
+            if self.stop_event is not None:
+                self.stop_event.set()
+            if self.standby is not None:
+                # The old session's parked plan does not follow the new
+                # instruction.
+                try:
+                    self.dispatch([], "standby", None)
+                except Exception as e:
+                    print(f"Could not withdraw standby plan: {e}")
+            self.session = dict(session, started=time.time())
+            self.standby = None
+            self.stop_event = threading.Event()
+            self.thread = threading.Thread(target=self._run, args=(self.session, self.stop_event),
+                                           name="continuous-planner", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        with self.lock:
+            if self.stop_event is None:
+                return False
+            self.stop_event.set()
+            self.stop_event = None
+            self.session = None
+            standby, self.standby = self.standby, None
+
+        if standby is not None:
+            # Withdraw the parked plan so the robot stops after its batch.
+            try:
+                self.dispatch([], "standby", None)
+            except Exception as e:
+                print(f"Could not withdraw standby plan: {e}")
+        return True
+
+    def _stale(self, key, other):
+        if key is None or other is None:
+            return False
+        return hamming_distance(key, other) > self.max_distance
+
+    def _run(self, session, stop_event):
+        while not stop_event.is_set():
+            try:
+                delay = self._step(session, stop_event)
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+                print(f"Continuous planner error: {e}")
+                delay = self.retry_delay
+            stop_event.wait(delay)
+
+    def _send(self, stop_event, commands, mode, trace_id, standby=None):
+        # Dispatches unless this session has been stopped or replaced. The
+        # lock makes stop() wait for a send in progress, so nothing reaches
+        # the controller once it has returned.
+        with self.lock:
+            if stop_event.is_set():
+                return False
+            self.dispatch(commands, mode, trace_id)
+            self.standby = standby
+            return True
+
+    def _step(self, session, stop_event):
+        # One round; returns how long to wait before the next.
+        status = self.controller_status()
+        with self.lock:
+            if stop_event.is_set():
+                return 0
+            if self.standby is not None and status.get("standby") != self.standby[0]:
+                if status.get("standby_used") == self.standby[0]:
+                    self.standby_used += 1
+                # Started, or replaced by a batch from somebody else.
+                self.standby = None
+
+        plan_request = self.capture(session)
+        if plan_request is None:
+            return self.retry_delay
+
+        if self.standby is not None:
+            if not self._stale(plan_request.image_key, self.standby[1]):
+                return self.interval
+            if not self._send(stop_event, [], "standby", None):
+                return 0
+            self.discarded_stale += 1
+
+        commands = self.plan(plan_request)
+        if stop_event.is_set():
+            return 0
+        if commands is None:
+            self.errors += 1
+            return self.retry_delay
+        self.plans += 1
+        if not commands:
+            return self.interval
+
+        # The robot kept moving while the model ran; a plan for a scene
+        # that is gone is not worth sending.
+        latest = self.capture(session)
+        if latest is not None and self._stale(latest.image_key, plan_request.image_key):
+            self.discarded_stale += 1
+            return 0
+
+        status = self.controller_status()
+        if status.get("busy"):
+            if self._send(stop_event, commands, "standby", plan_request.trace_id,
+                          (plan_request.trace_id, plan_request.image_key)):
+                self.standby_sent += 1
+        elif self._send(stop_event, commands, "replace", plan_request.trace_id):
+            self.started_idle += 1
+        return self.interval
+
+    def stats(self):
+        session = self.session
+        return {
+            "active": session is not None,
+            "user_prompt": session.get("user_prompt") if session else None,
+            "started": session.get("started") if session else None,
+            "standby": self.standby[0] if self.standby else None,
+            "plans": self.plans,
+            # Plans sent to an idle robot, which had to wait for them.
+            "started_idle": self.started_idle,
+            "standby_sent": self.standby_sent,
+            "standby_used": self.standby_used,
+            "discarded_stale": self.discarded_stale,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
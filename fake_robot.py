@@ -0,0 +1,262 @@
+# fake_robot.py
+# Stand-in for the Webots `controller` module so rosbot.py can run outside
+# the simulator for benchmarks. The robot drives around a square room; the
+# camera returns synthetic BGRA frames and the range devices ray-cast
+# against the room walls.
+import array
+import math
+import sys
+import time
+import types
+
+ROOM_HALF_SIZE = 2.0
+WHEEL_RADIUS = 0.0425
+TRACK_WIDTH = 0.192
+TURN_SLIP = 0.7
+
+
+def synthetic_frame(width, height, seed=0):
+    # Deterministic BGRA gradient, same layout as camera_rgb.getImage().
+    row = bytes((x * 7 + seed) % 256 for x in range(width * 4))
+    return b"".join(row[y % 4:] + row[:y % 4] for y in range(height))
+
+
+def wall_distance(x, y, angle, max_range):
+    dx, dy = math.cos(angle), math.sin(angle)
+    best = max_range
+    for d, p in ((dx, x), (dy, y)):
+        if d > 1e-9:
+            best = min(best, (ROOM_HALF_SIZE - p) / d)
+        elif d < -1e-9:
+            best = min(best, (-ROOM_HALF_SIZE - p) / d)
+    return max(0.0, best)
+
+
+class Device:
+    def __init__(self, robot, name):
+        self.robot = robot
+        self.name = name
+        self.sampling_period = 0
+
+    def enable(self, sampling_period):
+        self.sampling_period = sampling_period
+
+    def disable(self):
+        self.sampling_period = 0
+
+
+class Motor(Device):
+    def __init__(self, robot, name):
+        super().__init__(robot, name)
+        self.velocity = 0.0
+        self.position = 0.0
+        self.first_motion = None
+
+    def setPosition(self, position):
+        self.position = position
+
+    def setVelocity(self, velocity):
+        if velocity and self.first_motion is None:
+            self.first_motion = self.robot.wall_time()
+        self.velocity = velocity
+
+
+class PositionSensor(Device):
+    def __init__(self, robot, name, motor):
+        super().__init__(robot, name)
+        self.motor = motor
+        self.angle = 0.0
+
+    def getValue(self):
+        return self.angle if self.sampling_period else float("nan")
+
+
+class Camera(Device):
+    def __init__(self, robot, name, width=640, height=480, frames=4):
+        super().__init__(robot, name)
+        self.width = width
+        self.height = height
+        self.frames = [synthetic_frame(width, height, seed * 37) for seed in range(frames)]
+
+    def getWidth(self):
+        return self.width
+
+    def getHeight(self):
+        return self.height
+
+    def getImage(self):
+        return self.frames[self.robot.steps % len(self.frames)]
+
+
+class RangeFinder(Device):
+    def __init__(self, robot, name, width=320, height=240, fov=1.0, max_range=8.0):
+        super().__init__(robot, name)
+        self.width = width
+        self.height = height
+        self.fov = fov
+        self.max_range = max_range
+
+    def getWidth(self):
+        return self.width
+
+    def getHeight(self):
+        return self.height
+
+    def getFov(self):
+        return self.fov
+
+    def getMaxRange(self):
+        return self.max_range
+
+    def getRangeImage(self, data_type="list"):
+        x, y, theta = self.robot.pose
+        row = array.array("f", (
+            wall_distance(x, y, theta + self.fov / 2 - self.fov * i / (self.width - 1), self.max_range)
+            for i in range(self.width)))
+        image = row * self.height
+        return image.tobytes() if data_type == "buffer" else image.tolist()
+
+
+class Lidar(Device):
+    def __init__(self, robot, name, resolution=400, max_range=12.0):
+        super().__init__(robot, name)
+        self.resolution = resolution
+        self.max_range = max_range
+        self.point_cloud = False
+
+    def enablePointCloud(self):
+        self.point_cloud = True
+
+    def getHorizontalResolution(self):
+        return self.resolution
+
+    def getNumberOfLayers(self):
+        return 1
+
+    def getFov(self):
+        return 2 * math.pi
+
+    def getMaxRange(self):
+        return self.max_range
+
+    def getRangeImage(self, data_type="list"):
+        # Webots lidars scan clockwise starting from the back.
+        x, y, theta = self.robot.pose
+        step = 2 * math.pi / self.resolution
+        image = array.array("f", (
+            wall_distance(x, y, theta + math.pi - i * step, self.max_range)
+            for i in range(self.resolution)))
+        return image.tobytes() if data_type == "buffer" else image.tolist()
+
+
+class VectorSensor(Device):
+    def __init__(self, robot, name, read):
+        super().__init__(robot, name)
+        self.read = read
+
+    def getValues(self):
+        if not self.sampling_period:
+            return [float("nan")] * 3
+        return self.read()
+
+
+class DistanceSensor(Device):
+    def __init__(self, robot, name, bearing, max_range=2.0):
+        super().__init__(robot, name)
+        self.bearing = bearing
+        self.max_range = max_range
+
+    def getValue(self):
+        x, y, theta = self.robot.pose
+        return wall_distance(x, y, theta + self.bearing, self.max_range)
+
+
+class Robot:
+    # Class-level knobs so benchmarks can configure the instance that
+    # ROSbotController creates itself.
+    max_steps = None
+    camera_size = (640, 480)
+    clock = None
+
+    def __init__(self):
+        self.time = 0.0
+        self.steps = 0
+        self.pose = (0.0, 0.0, 0.0)
+        self.omega = 0.0
+
+        motors = {name: Motor(self, name) for name in
+                  ("fl_wheel_joint", "fr_wheel_joint", "rl_wheel_joint", "rr_wheel_joint")}
+        self.motors = motors
+        sensors = {
+            "front left wheel motor sensor": motors["fl_wheel_joint"],
+            "front right wheel motor sensor": motors["fr_wheel_joint"],
+            "rear left wheel motor sensor": motors["rl_wheel_joint"],
+            "rear right wheel motor sensor": motors["rr_wheel_joint"],
+        }
+        self.position_sensors = [PositionSensor(self, name, motor) for name, motor in sensors.items()]
+
+        width, height = self.camera_size
+        self.devices = dict(motors)
+        self.devices.update({sensor.name: sensor for sensor in self.position_sensors})
+        self.devices.update({
+            "camera rgb": Camera(self, "camera rgb", width, height),
+            "camera depth": RangeFinder(self, "camera depth"),
+            "laser": Lidar(self, "laser"),
+            "imu accelerometer": VectorSensor(self, "imu accelerometer", lambda: [0.0, 0.0, 9.81]),
+            "imu gyro": VectorSensor(self, "imu gyro", lambda: [0.0, 0.0, self.omega]),
+            "imu compass": VectorSensor(self, "imu compass", self._compass),
+            "fl_range": DistanceSensor(self, "fl_range", 0.3),
+            "rl_range": DistanceSensor(self, "rl_range", math.pi - 0.3),
+            "fr_range": DistanceSensor(self, "fr_range", -0.3),
+            "rr_range": DistanceSensor(self, "rr_range", math.pi + 0.3),
+        })
+
+    def wall_time(self):
+        return time.perf_counter()
+
+    def _compass(self):
+        theta = self.pose[2]
+        return [math.cos(theta), -math.sin(theta), 0.0]
+
+    def getDevice(self, name):
+        return self.devices[name]
+
+    def getTime(self):
+        return self.time
+
+    def getBasicTimeStep(self):
+        return 32.0
+
+    def step(self, duration):
+        if self.max_steps is not None and self.steps >= self.max_steps:
+            return -1
+
+        dt = duration / 1000.0
+        for sensor in self.position_sensors:
+            sensor.angle += sensor.motor.velocity * dt
+
+        left = (self.motors["fl_wheel_joint"].velocity + self.motors["rl_wheel_joint"].velocity) / 2
+        right = (self.motors["fr_wheel_joint"].velocity + self.motors["rr_wheel_joint"].velocity) / 2
+        v = (left + right) / 2 * WHEEL_RADIUS
+        self.omega = (right - left) * WHEEL_RADIUS / TRACK_WIDTH * TURN_SLIP
+
+        x, y, theta = self.pose
+        theta += self.omega * dt
+        limit = ROOM_HALF_SIZE - 0.15
+        x = min(max(x + v * math.cos(theta) * dt, -limit), limit)
+        y = min(max(y + v * math.sin(theta) * dt, -limit), limit)
+        self.pose = (x, y, theta)
+
+        self.time += dt
+        self.steps += 1
+        if self.clock is not None:
+            self.clock(self)
+        return 0
+
+
+def install():
+    # Makes `from controller import Robot` resolve to this module.
+    module = types.ModuleType("controller")
+    module.Robot = Robot
+    sys.modules["controller"] = module
+    return module
@@ -0,0 +1,91 @@
+# frame_encoder.py
+import io
+import struct
+
+from lazy_modules import LazyModule
+
+# Detected once here; imported on the first frame that needs them.
+np = LazyModule("numpy")
+Image = LazyModule("PIL.Image")
+
+HAS_NUMPY = np.available
+HAS_PIL = Image.available
+
+BMP_HEADER = struct.Struct("<2sIHHIIiiHHIIiiII")
+
+FORMAT_EXTENSIONS = {
+    "JPEG": ".jpg",
+    "PNG": ".png",
+    "BMP": ".bmp",
+}
+
+
+def bgra_view(buffer, width, height):
+    # Webots hands out the camera image as a packed BGRA byte string.
+    # Both views below share memory with it; nothing is copied.
+    if HAS_NUMPY:
+        return np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 4)
+    return memoryview(buffer)
+
+
+def encode_bmp(buffer, width, height):
+    row_size = width * 3
+    padding = (4 - row_size % 4) % 4
+    stride = row_size + padding
+    image_size = stride * height
+
+    out = bytearray(BMP_HEADER.size + image_size)
+    BMP_HEADER.pack_into(
+        out, 0,
+        b"BM", len(out), 0, 0, BMP_HEADER.size,
+        40, width, height, 1, 24, 0, image_size, 0, 0, 0, 0,
+    )
+
+    if HAS_NUMPY:
+        frame = bgra_view(buffer, width, height)
+        pixels = np.frombuffer(out, dtype=np.uint8, offset=BMP_HEADER.size)
+        pixels = pixels.reshape(height, stride)[:, :row_size].reshape(height, width, 3)
+        pixels[:] = frame[::-1, :, :3]
+        return bytes(out)
+
+    # BMP rows are stored bottom-up in BGR order, which is the camera layout
+    # without its alpha byte, so each row is three strided slice copies.
+    view = memoryview(buffer)
+    src_stride = width * 4
+    offset = BMP_HEADER.size
+    for y in range(height - 1, -1, -1):
+        row = view[y * src_stride:(y + 1) * src_stride]
+        out[offset:offset + row_size:3] = row[0::4]
+        out[offset + 1:offset + row_size:3] = row[1::4]
+        out[offset + 2:offset + row_size:3] = row[2::4]
+        offset += stride
+    return bytes(out)
+
+
+def to_pil_image(buffer, width, height):
+    if not HAS_PIL:
+        raise RuntimeError("PIL is required for image conversion")
+    # The "BGRX" raw mode reorders the channels and drops alpha inside PIL's
+    # C decoder, reading straight from the camera buffer.
+    return Image.frombuffer("RGB", (width, height), buffer, "raw", "BGRX", 0, 1)
+
+
+def encode_frame(buffer, width, height, fmt="JPEG", quality=85):
+    fmt = fmt.upper()
+    if fmt == "JPG":
+        fmt = "JPEG"
+
+    if fmt == "BMP" or not HAS_PIL:
+        return encode_bmp(buffer, width, height), "BMP"
+
+    image = to_pil_image(buffer, width, height)
+    output = io.BytesIO()
+    if fmt == "JPEG":
+        image.save(output, format="JPEG", quality=quality)
+    else:
+        image.save(output, format=fmt)
+    return output.getvalue(), fmt
+
+
+def extension_for(fmt):
+    return FORMAT_EXTENSIONS.get(fmt.upper(), ".bin")
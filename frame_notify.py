@@ -0,0 +1,61 @@
+# frame_notify.py
+# Wakes frame consumers as soon as the controller publishes a frame, instead
+# of having them poll the ring or index file. Notifications are best-effort
+# localhost UDP datagrams: a consumer that misses one picks the frame up on
+# its next fallback poll.
+import json
+import os
+import socket
+import time
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = int(os.environ.get("ROSBOT_FRAME_NOTIFY_PORT", 5006))
+
+
+class FrameNotifier:
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.address = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+    def notify(self, seq, **fields):
+        message = json.dumps(dict(fields, seq=seq, time=time.time())).encode("utf-8")
+        try:
+            self.sock.sendto(message, self.address)
+        except OSError:
+            # Nobody listening, or the socket buffer is full; either way the
+            # consumer will fall back to polling.
+            pass
+
+    def close(self):
+        self.sock.close()
+
+
+class FrameListener:
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+
+    def wait(self, timeout):
+        # Returns the newest notification received within timeout, or None.
+        # Older notifications queued behind it are discarded.
+        self.sock.settimeout(timeout)
+        try:
+            data = self.sock.recv(65536)
+        except OSError:
+            return None
+
+        self.sock.setblocking(False)
+        try:
+            while True:
+                data = self.sock.recv(65536)
+        except OSError:
+            pass
+
+        try:
+            return json.loads(data)
+        except ValueError:
+            return None
+
+    def close(self):
+        self.sock.close()
@@ -0,0 +1,222 @@
+# frame_ring.py
+import json
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+DEFAULT_RING_NAME = "rosbot_frames"
+DEFAULT_SLOTS = 8
+DEFAULT_SLOT_SIZE = 2 * 1024 * 1024
+
+MAGIC = b"RBFR"
+VERSION = 1
+
+# magic, version, slot count, slot size, latest sequence number
+RING_HEADER = struct.Struct("<4sHxxIIQ")
+# sequence number, timestamp, width, height, format, metadata length, data length
+SLOT_HEADER = struct.Struct("<QdIIHHI")
+
+FORMAT_CODES = {
+    "JPEG": 1,
+    "PNG": 2,
+    "BMP": 3,
+    "BGRA": 4,
+}
+FORMAT_NAMES = {code: name for name, code in FORMAT_CODES.items()}
+
+def slot_size_for(width, height, meta_bytes=64 * 1024):
+    # Room for an uncompressed BGRA frame, the largest format a slot can
+    # hold, so BMP frames written without Pillow fit at any resolution.
+    return max(DEFAULT_SLOT_SIZE, SLOT_HEADER.size + meta_bytes + width * height * 4)
+
+
+def ring_name():
+    # The controller, the server and the GUI must agree on this; read at
+    # call time so tools can set ROSBOT_FRAME_RING after importing.
+    return os.environ.get("ROSBOT_FRAME_RING", DEFAULT_RING_NAME)
+
+
+Frame = namedtuple("Frame", ["seq", "timestamp", "width", "height", "format", "data", "meta"])
+
+
+def _attach_untracked(name):
+    shm = shared_memory.SharedMemory(name=name)
+    # Before Python 3.13 every process that attaches registers the segment
+    # with its resource tracker, which unlinks it on exit even though the
+    # controller still owns it.
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+
+class FrameRing:
+    def __init__(self, shm, owner=False):
+        self.shm = shm
+        self.owner = owner
+        self.buf = shm.buf
+
+        magic, version, slots, slot_size, _ = RING_HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Shared memory '{shm.name}' is not a frame ring")
+
+        self.name = shm.name
+        self.slots = slots
+        self.slot_size = slot_size
+        self.max_payload = slot_size - SLOT_HEADER.size
+
+    @classmethod
+    def create(cls, name=DEFAULT_RING_NAME, slots=DEFAULT_SLOTS, slot_size=DEFAULT_SLOT_SIZE):
+        size = RING_HEADER.size + slots * slot_size
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a controller that did not shut down cleanly.
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        shm.buf[:RING_HEADER.size + slots * SLOT_HEADER.size] = bytes(RING_HEADER.size + slots * SLOT_HEADER.size)
+        RING_HEADER.pack_into(shm.buf, 0, MAGIC, VERSION, slots, slot_size, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name=DEFAULT_RING_NAME):
+        return cls(_attach_untracked(name))
+
+    def _slot_offset(self, seq):
+        return RING_HEADER.size + (seq % self.slots) * self.slot_size
+
+    @property
+    def latest_seq(self):
+        return struct.unpack_from("<Q", self.buf, RING_HEADER.size - 8)[0]
+
+    def write(self, data, width, height, fmt="JPEG", timestamp=None, meta=None):
+        meta_bytes = json.dumps(meta).encode("utf-8") if meta else b""
+        if len(meta_bytes) + len(data) > self.max_payload:
+            raise ValueError(f"Frame of {len(data)} bytes does not fit in a {self.slot_size} byte slot")
+
+        seq = self.latest_seq + 1
+        offset = self._slot_offset(seq)
+        start = offset + SLOT_HEADER.size
+
+        # A zero sequence number marks the slot as being rewritten so readers
+        # that raced with us discard what they copied.
+        struct.pack_into("<Q", self.buf, offset, 0)
+        self.buf[start:start + len(meta_bytes)] = meta_bytes
+        self.buf[start + len(meta_bytes):start + len(meta_bytes) + len(data)] = data
+        SLOT_HEADER.pack_into(
+            self.buf, offset,
+            seq, time.time() if timestamp is None else timestamp, width, height,
+            FORMAT_CODES[fmt.upper()], len(meta_bytes), len(data),
+        )
+        struct.pack_into("<Q", self.buf, RING_HEADER.size - 8, seq)
+        return seq
+
+    def read(self, seq):
+        if seq <= 0 or seq > self.latest_seq or self.latest_seq - seq >= self.slots:
+            return None
+
+        offset = self._slot_offset(seq)
+        slot_seq, timestamp, width, height, fmt, meta_len, data_len = SLOT_HEADER.unpack_from(self.buf, offset)
+        if slot_seq != seq:
+            return None
+
+        start = offset + SLOT_HEADER.size
+        meta_bytes = bytes(self.buf[start:start + meta_len])
+        data = bytes(self.buf[start + meta_len:start + meta_len + data_len])
+
+        if struct.unpack_from("<Q", self.buf, offset)[0] != seq:
+            return None
+
+        meta = json.loads(meta_bytes) if meta_bytes else {}
+        return Frame(seq, timestamp, width, height, FORMAT_NAMES.get(fmt, "BGRA"), data, meta)
+
+    def read_latest(self):
+        for _ in range(3):
+            frame = self.read(self.latest_seq)
+            if frame is not None:
+                return frame
+        return None
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingReader:
+    # Shared by the server's request threads. A restarted controller creates
+    # a fresh segment under the same name and leaves readers mapped to the
+    # old one, so stale or missing frames trigger a re-attach, at most once
+    # per reattach_interval. A replaced mapping is closed only once no
+    # thread is still reading from it.
+    def __init__(self, name, stale_after=5.0, reattach_interval=1.0):
+        self.name = name
+        self.stale_after = stale_after
+        self.reattach_interval = reattach_interval
+        self.lock = threading.Lock()
+        self.ring = None
+        # mapping -> number of threads reading from it
+        self.readers = {}
+        self.retired = []
+        self.last_attach = None
+
+    def _attach(self):
+        # Called with the lock held. Keeps the old mapping if the segment is
+        # gone, so its last frames can still be served.
+        self.last_attach = time.monotonic()
+        try:
+            ring = FrameRing.attach(self.name)
+        except (FileNotFoundError, ValueError):
+            return False
+        if self.ring is not None:
+            self.retired.append(self.ring)
+        self.ring = ring
+        self._close_retired()
+        return True
+
+    def _close_retired(self):
+        for ring in [r for r in self.retired if not self.readers.get(r)]:
+            self.retired.remove(ring)
+            self.readers.pop(ring, None)
+            ring.close()
+
+    def _read(self, seq):
+        with self.lock:
+            ring = self.ring
+            if ring is None:
+                return None
+            self.readers[ring] = self.readers.get(ring, 0) + 1
+        try:
+            frame = ring.read(seq) if isinstance(seq, int) else None
+            return frame or ring.read_latest()
+        finally:
+            with self.lock:
+                self.readers[ring] -= 1
+                self._close_retired()
+
+    def read(self, seq=None):
+        # Frame `seq` if it is still in the ring, else the newest frame.
+        frame = self._read(seq)
+        if frame is None or time.time() - frame.timestamp > self.stale_after:
+            with self.lock:
+                due = self.ring is None or time.monotonic() - self.last_attach >= self.reattach_interval
+                attached = due and self._attach()
+            if attached:
+                frame = self._read(seq) or frame
+        return frame
+
+    def close(self):
+        with self.lock:
+            if self.ring is not None:
+                self.retired.append(self.ring)
+                self.ring = None
+            self._close_retired()
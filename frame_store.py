@@ -0,0 +1,112 @@
+# frame_store.py
+import json
+import os
+import re
+import time
+from collections import deque
+
+from frame_encoder import extension_for
+
+DEFAULT_PREFIX = "rosbot_image_"
+INDEX_NAME = "rosbot_latest.json"
+
+
+def write_atomic(path, data):
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def read_frame_index(directory, index_name=INDEX_NAME):
+    try:
+        with open(os.path.join(directory, index_name), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class FrameStore:
+    def __init__(self, directory, prefix=DEFAULT_PREFIX, max_frames=100, max_bytes=None,
+                 max_age=None, index_name=INDEX_NAME):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.index_path = os.path.join(directory, index_name)
+
+        # seq, path, size, timestamp for every retained frame, oldest first
+        self.frames = deque()
+        self.total_bytes = 0
+        self.seq = 0
+
+        self._load_existing()
+
+    def _load_existing(self):
+        pattern = re.compile(re.escape(self.prefix) + r"(\d{8})\.\w+$")
+        existing = []
+        for entry in os.scandir(self.directory):
+            match = pattern.match(entry.name)
+            if match and entry.is_file():
+                stat = entry.stat()
+                existing.append((int(match.group(1)), entry.path, stat.st_size, stat.st_mtime))
+
+        existing.sort()
+        for record in existing:
+            self.frames.append(record)
+            self.total_bytes += record[2]
+
+        index = read_frame_index(self.directory, os.path.basename(self.index_path))
+        last_seq = existing[-1][0] if existing else 0
+        self.seq = max(last_seq, index.get("seq", 0) if index else 0)
+        self.evict()
+
+    def path_for(self, seq, fmt):
+        return os.path.join(self.directory, f"{self.prefix}{seq:08d}{extension_for(fmt)}")
+
+    def save(self, data, width, height, fmt="JPEG", timestamp=None, meta=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        self.seq += 1
+        path = self.path_for(self.seq, fmt)
+
+        # Readers only ever see complete files: the frame and the index are
+        # each written to a temporary name and renamed into place.
+        write_atomic(path, data)
+        self.frames.append((self.seq, path, len(data), timestamp))
+        self.total_bytes += len(data)
+
+        index = {
+            "seq": self.seq,
+            "path": path,
+            "timestamp": timestamp,
+            "width": width,
+            "height": height,
+            "format": fmt,
+        }
+        if meta:
+            index["meta"] = meta
+        write_atomic(self.index_path, json.dumps(index).encode("utf-8"))
+
+        self.evict(timestamp)
+        return self.seq, path
+
+    def _over_limit(self, now):
+        if self.max_frames is not None and len(self.frames) > self.max_frames:
+            return True
+        if self.max_bytes is not None and self.total_bytes > self.max_bytes:
+            return True
+        if self.max_age is not None and now - self.frames[0][3] > self.max_age:
+            return True
+        return False
+
+    def evict(self, now=None):
+        now = time.time() if now is None else now
+        # The newest frame is always kept so the index never dangles.
+        while len(self.frames) > 1 and self._over_limit(now):
+            _, path, size, _ = self.frames.popleft()
+            self.total_bytes -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
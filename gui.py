@@ -1,12 +1,27 @@
 import tkinter as tk
 from tkinter import ttk
-import requests
 import threading
 import time
 import os
 import json
 import tempfile
-from PIL import Image, ImageTk
+import io
+import uuid
+import base64
+from urllib.parse import urlparse
+
+from frame_ring import FrameRing, ring_name
+from frame_store import read_frame_index
+from command_channel import CommandClient
+from frame_notify import FrameListener
+from tracing import Tracer
+from lazy_modules import LazyModule
+
+# Loaded on first use so the window comes up without waiting for them:
+# PIL with the first frame, requests with the first prompt.
+requests = LazyModule("requests")
+Image = LazyModule("PIL.Image")
+ImageTk = LazyModule("PIL.ImageTk")
 
 class ROSbotGUI:
     def __init__(self, root, vla_api_url="http://localhost:5000"):
@@ -15,15 +30,37 @@ class ROSbotGUI:
         self.root.geometry("800x600")
         
         self.vla_api_url = vla_api_url
+        # A server on another machine cannot read our frames, so send them.
+        self.upload_images = urlparse(vla_api_url).hostname not in ("localhost", "127.0.0.1", "::1")
         self.latest_image_path = None
+        self.latest_frame_seq = None
+        self.latest_frame_data = None
+        self.latest_trace_id = None
+        self.latest_obstacles = None
         self.latest_image = None
+        self.frame_ring = None
+        
+        # Frames are decoded and scaled on the monitor thread; the newest
+        # one waits here until the Tk thread shows it.
+        self.display_size = (700, 400)
+        self.display_lock = threading.Lock()
+        self.pending_display = None
+        
+        try:
+            self.frame_listener = FrameListener()
+        except OSError as e:
+            print(f"Frame notifications unavailable, polling for frames: {e}")
+            self.frame_listener = None
         
         self.temp_dir = tempfile.gettempdir()
         
-        self.command_file = os.path.join(self.temp_dir, "rosbot_commands.json")
+        self.command_client = CommandClient()
+        self.client_id = uuid.uuid4().hex
+        self.tracer = Tracer.from_env("gui")
+        self.continuous_active = False
         
         print(f"ROSbot GUI initialized. Temp directory: {self.temp_dir}")
-        print(f"Command file: {self.command_file}")
+        print(f"Command channel: {self.command_client.host}:{self.command_client.port}")
         
         self.create_widgets()
         
@@ -41,6 +78,7 @@ class ROSbotGUI:
         
         self.image_label = ttk.Label(self.image_frame)
         self.image_label.pack(fill=tk.BOTH, expand=True)
+        self.image_frame.bind("<Configure>", self.on_resize)
         
         prompt_frame = ttk.Frame(main_frame)
         prompt_frame.pack(fill=tk.X, pady=10)
@@ -55,63 +93,157 @@ class ROSbotGUI:
         self.send_button = ttk.Button(prompt_frame, text="Send", command=self.send_prompt)
         self.send_button.pack(side=tk.LEFT, padx=5)
         
+        self.stream_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(prompt_frame, text="Stream", variable=self.stream_var).pack(side=tk.LEFT, padx=5)
+        
+        # Keeps planning on new frames while the robot moves, until stopped.
+        self.continuous_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(prompt_frame, text="Continuous", variable=self.continuous_var).pack(side=tk.LEFT, padx=5)
+        ttk.Button(prompt_frame, text="Stop", command=self.stop_continuous).pack(side=tk.LEFT, padx=5)
+        
         self.status_var = tk.StringVar()
         self.status_var.set("Ready")
         status_bar = ttk.Label(self.root, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
         status_bar.pack(side=tk.BOTTOM, fill=tk.X)
     
-    def update_image(self, image_path):
+    def on_resize(self, event):
+        # Read by the monitor thread, which must not call into Tk itself.
+        if event.width > 11 and event.height > 11:
+            self.display_size = (event.width - 10, event.height - 10)
+    
+    def update_image(self, image_path, trace_id=None, obstacles=None):
+        # Runs on the monitor thread.
         if not os.path.exists(image_path):
-            self.status_var.set(f"Error: Image not found at {image_path}")
+            self.root.after(0, lambda: self.status_var.set(f"Error: Image not found at {image_path}"))
             return
         
         try:
-            pil_image = Image.open(image_path)
-            w, h = pil_image.size
-            
-            display_w = self.image_frame.winfo_width() - 10
-            display_h = self.image_frame.winfo_height() - 10
-            
-            if display_w <= 1 or display_h <= 1:
-                display_w, display_h = 700, 400
-            
-            ratio = min(display_w/w, display_h/h)
-            new_size = (int(w * ratio), int(h * ratio))
-            
-            resized_image = pil_image.resize(new_size, Image.LANCZOS)
-            
-            tk_image = ImageTk.PhotoImage(resized_image)
-            self.image_label.configure(image=tk_image)
-            self.image_label.image = tk_image
-            
-            self.latest_image = tk_image
-            self.latest_image_path = image_path
-            self.status_var.set(f"Updated image: {os.path.basename(image_path)}")
+            with self.tracer.span("gui.decode", trace_id):
+                image = self.load_display_image(image_path)
+            self.publish_display(image, f"Updated image: {os.path.basename(image_path)}",
+                                 latest_image_path=image_path, latest_frame_seq=None,
+                                 latest_frame_data=None, latest_trace_id=trace_id,
+                                 latest_obstacles=obstacles)
         
         except Exception as e:
-            self.status_var.set(f"Error updating image: {str(e)}")
+            self.root.after(0, lambda m=str(e): self.status_var.set(f"Error updating image: {m}"))
+    
+    def update_frame(self, frame):
+        # Runs on the monitor thread.
+        try:
+            trace_id = frame.meta.get("trace_id")
+            with self.tracer.span("gui.decode", trace_id):
+                image = self.load_display_image(io.BytesIO(frame.data))
+            self.publish_display(image, f"Updated frame: {frame.seq}",
+                                 latest_image_path=None, latest_frame_seq=frame.seq,
+                                 latest_frame_data=frame.data, latest_trace_id=trace_id,
+                                 latest_obstacles=frame.meta.get("obstacles"))
+        
+        except Exception as e:
+            self.root.after(0, lambda m=str(e): self.status_var.set(f"Error updating image: {m}"))
+    
+    def load_display_image(self, source):
+        pil_image = Image.open(source)
+        w, h = pil_image.size
+        display_w, display_h = self.display_size
+        
+        ratio = min(display_w/w, display_h/h)
+        new_size = (max(1, int(w * ratio)), max(1, int(h * ratio)))
+        
+        # JPEG frames decode straight to a reduced scale, and bilinear is
+        # plenty for a preview that is replaced several times a second.
+        pil_image.draft("RGB", new_size)
+        return pil_image.convert("RGB").resize(new_size, Image.BILINEAR)
+    
+    def publish_display(self, pil_image, status, **latest):
+        # Hands a decoded frame to the Tk thread. If the previous one has not
+        # been shown yet it is replaced rather than queued behind, so a busy
+        # UI skips frames instead of falling further behind.
+        with self.display_lock:
+            scheduled = self.pending_display is not None
+            self.pending_display = (pil_image, status, latest)
+        if not scheduled:
+            self.root.after(0, self.show_pending_display)
+    
+    def show_pending_display(self):
+        with self.display_lock:
+            pending, self.pending_display = self.pending_display, None
+        if pending is None:
+            return
+        
+        pil_image, status, latest = pending
+        with self.tracer.span("gui.display", latest["latest_trace_id"]):
+            self.show_image(pil_image)
+        for name, value in latest.items():
+            setattr(self, name, value)
+        self.status_var.set(status)
+    
+    def show_image(self, pil_image):
+        # Tk is not thread-safe, so the PhotoImage is created here on the Tk
+        # thread; the image is already scaled, which leaves only a copy.
+        tk_image = ImageTk.PhotoImage(pil_image)
+        self.image_label.configure(image=tk_image)
+        self.image_label.image = tk_image
+        
+        self.latest_image = tk_image
+    
+    def attach_frame_ring(self):
+        try:
+            return FrameRing.attach(ring_name())
+        except (FileNotFoundError, ValueError):
+            return None
+    
+    def wait_for_frame(self):
+        # Returns as soon as the controller announces a frame. Without a
+        # listener, or when a notification is lost, this falls back to a
+        # short poll of the ring or index file.
+        if self.frame_listener is not None:
+            self.frame_listener.wait(0.5)
+        else:
+            time.sleep(0.1)
     
     def monitor_for_images(self):
-        last_image_time = 0
+        last_index_seq = 0
+        last_frame_seq = 0
+        last_frame_change = time.time()
         
         while self.running:
             try:
-                img_files = [f for f in os.listdir(self.temp_dir) if f.startswith("rosbot_image_") and f.endswith((".jpg", ".bmp"))]
+                if self.frame_ring is None:
+                    self.frame_ring = self.attach_frame_ring()
+                    last_frame_seq = 0
                 
-                if img_files:
-                    img_files.sort(key=lambda x: os.path.getmtime(os.path.join(self.temp_dir, x)), reverse=True)
-                    newest_img = img_files[0]
-                    img_path = os.path.join(self.temp_dir, newest_img)
-                    img_time = os.path.getmtime(img_path)
+                if self.frame_ring is not None:
+                    if self.frame_ring.latest_seq != last_frame_seq:
+                        frame = self.frame_ring.read_latest()
+                        if frame is not None:
+                            last_frame_seq = frame.seq
+                            last_frame_change = time.time()
+                            # Time from the controller publishing the frame
+                            # to the GUI noticing it.
+                            self.tracer.record("gui.frame_detected", frame.meta.get("trace_id"), frame.timestamp)
+                            self.update_frame(frame)
+                    elif time.time() - last_frame_change > 5:
+                        # The controller may have restarted with a new segment.
+                        self.frame_ring.close()
+                        self.frame_ring = None
+                        last_frame_change = time.time()
                     
-                    if img_time > last_image_time:
-                        last_image_time = img_time
-                        self.root.after(100, lambda p=img_path: self.update_image(p))
+                    self.wait_for_frame()
+                    continue
+                
+                index = read_frame_index(self.temp_dir)
+                
+                if index and index["seq"] != last_index_seq:
+                    last_index_seq = index["seq"]
+                    meta = index.get("meta") or {}
+                    self.tracer.record("gui.frame_detected", meta.get("trace_id"), index["timestamp"])
+                    self.update_image(index["path"], meta.get("trace_id"), meta.get("obstacles"))
             
             except Exception as e:
                 print(f"Error in monitor thread: {e}")
             
-            time.sleep(0.5)
+            self.wait_for_frame()
     
     def send_prompt(self, event=None):
         prompt = self.prompt_var.get().strip()
@@ -119,41 +251,158 @@ class ROSbotGUI:
             self.status_var.set("Please enter a prompt")
             return
         
-        if not self.latest_image_path:
+        if not self.latest_image_path and not self.latest_frame_seq:
             self.status_var.set("No image available to process")
             return
         
         self.status_var.set(f"Processing prompt: {prompt}")
         
-        thread = threading.Thread(target=self.process_prompt_thread, args=(prompt,))
+        if self.continuous_var.get():
+            target = self.continuous_prompt_thread
+        elif self.stream_var.get():
+            target = self.stream_prompt_thread
+        else:
+            target = self.process_prompt_thread
+        thread = threading.Thread(target=target, args=(prompt,))
+        thread.daemon = True
+        thread.start()
+    
+    def request_plan(self, payload):
+        # Submits an asynchronous job and long-polls it; returns the final
+        # job record from the server.
+        response = requests.post(f"{self.vla_api_url}/jobs", json=dict(payload, client_id=self.client_id))
+        if response.status_code != 202:
+            return {"status": "failed", "error": f"API returned {response.status_code}: {response.text}"}
+        
+        job = response.json()
+        while job["status"] in ("queued", "running"):
+            response = requests.get(f"{self.vla_api_url}/jobs/{job['job_id']}", params={"wait": 30})
+            job = response.json()
+        return job
+    
+    def prompt_payload(self, prompt):
+        # The frame's trace id and obstacle summary travel with the request,
+        # which matters when the server cannot read the frame's metadata.
+        payload = {"user_prompt": prompt, "trace_id": self.latest_trace_id, "obstacles": self.latest_obstacles}
+        if self.upload_images:
+            data = self.latest_frame_data
+            if data is None:
+                with open(self.latest_image_path, "rb") as f:
+                    data = f.read()
+            payload["image_base64"] = base64.b64encode(data).decode("ascii")
+        elif self.latest_frame_seq:
+            payload["frame_seq"] = self.latest_frame_seq
+        else:
+            payload["image_path"] = self.latest_image_path
+        return payload
+    
+    def stream_prompt_thread(self, prompt):
+        # Forwards each command to the robot as soon as the server has
+        # generated it, so motion starts before the full plan is ready.
+        sent = []
+        payload = self.prompt_payload(prompt)
+        trace_id = payload["trace_id"]
+        start = time.time()
+        try:
+            response = requests.post(f"{self.vla_api_url}/process-image/stream", json=payload, stream=True)
+            if response.status_code != 200:
+                self.root.after(0, lambda: self.status_var.set(f"Error: API returned {response.status_code}: {response.text}"))
+                return
+            
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["type"] == "command":
+                    command = event["command"]
+                    if not sent:
+                        self.tracer.record("gui.first_command", trace_id, start)
+                    with self.tracer.span("gui.dispatch", trace_id, index=len(sent)):
+                        self.command_client.send([command], mode="replace" if not sent else "append",
+                                                 trace_id=trace_id)
+                    sent.append(f"{command['name']}({command['value']:g})")
+                    summary = ", ".join(sent)
+                    self.root.after(0, lambda s=summary: self.status_var.set(f"Commands sent to robot: {s}"))
+                elif event["type"] == "error":
+                    message = event["error"].get("message")
+                    self.root.after(0, lambda m=message: self.status_var.set(f"Error: {m}"))
+            
+            self.tracer.record("gui.request", trace_id, start, endpoint="/process-image/stream", commands=len(sent))
+        
+        except Exception as e:
+            self.root.after(0, lambda m=str(e): self.status_var.set(f"Error: {m}"))
+    
+    def continuous_prompt_thread(self, prompt):
+        # The server reads frames and dispatches commands itself from here on.
+        try:
+            response = requests.post(f"{self.vla_api_url}/continuous",
+                                     json={"user_prompt": prompt, "robot_id": self.client_id})
+            if response.status_code != 200:
+                self.root.after(0, lambda: self.status_var.set(f"Error: API returned {response.status_code}: {response.text}"))
+                return
+            self.continuous_active = True
+            self.root.after(0, lambda: self.status_var.set(f"Continuous mode: {prompt}"))
+        except Exception as e:
+            self.root.after(0, lambda m=str(e): self.status_var.set(f"Error: {m}"))
+    
+    def stop_continuous(self):
+        def stop():
+            try:
+                requests.delete(f"{self.vla_api_url}/continuous", timeout=5)
+                self.continuous_active = False
+                self.root.after(0, lambda: self.status_var.set("Continuous mode stopped"))
+            except Exception as e:
+                self.root.after(0, lambda m=str(e): self.status_var.set(f"Error: {m}"))
+        
+        thread = threading.Thread(target=stop)
         thread.daemon = True
         thread.start()
     
     def process_prompt_thread(self, prompt):
+        payload = self.prompt_payload(prompt)
+        trace_id = payload["trace_id"]
+        
         try:
-            response = requests.post(
-                f"{self.vla_api_url}/process-image",
-                json={"image_path": self.latest_image_path, "user_prompt": prompt}
-            )
+            with self.tracer.span("gui.request", trace_id, endpoint="/jobs"):
+                job = self.request_plan(payload)
+            trace_id = job.get("result", {}).get("trace_id", trace_id)
             
-            if response.status_code == 200:
-                result = response.json()
+            if job["status"] == "done" and job["result"].get("status_code") == 200:
+                result = job["result"]
                 if "commands" in result:
                     commands = result["commands"]
-                    self.root.after(0, lambda: self.status_var.set(f"Commands received: {commands}"))
+                    summary = ", ".join(f"{c['name']}({c['value']:g})" for c in commands)
+                    self.root.after(0, lambda: self.status_var.set(f"Commands received: {summary}"))
                     
-                    with open(self.command_file, 'w') as f:
-                        json.dump({"commands": commands}, f)
+                    with self.tracer.span("gui.dispatch", trace_id, commands=len(commands)):
+                        self.command_client.send(commands, trace_id=trace_id)
+                    self.root.after(0, lambda: self.status_var.set(f"Commands sent to robot: {summary}"))
                 else:
                     self.root.after(0, lambda: self.status_var.set(f"Error: Unexpected API response: {result}"))
+            elif job["status"] == "cancelled":
+                print(f"Prompt '{prompt}' superseded by a newer one")
+            elif job["status"] == "done":
+                result = job["result"]
+                self.root.after(0, lambda: self.status_var.set(f"Error: API returned {result['status_code']}: {result.get('error')}"))
             else:
-                self.root.after(0, lambda: self.status_var.set(f"Error: API returned {response.status_code}: {response.text}"))
+                self.root.after(0, lambda: self.status_var.set(f"Error: {job.get('error')}"))
         
         except Exception as e:
-            self.root.after(0, lambda: self.status_var.set(f"Error: {str(e)}"))
+            self.root.after(0, lambda m=str(e): self.status_var.set(f"Error: {m}"))
     
     def on_closing(self):
         self.running = False
+        if self.continuous_active:
+            try:
+                requests.delete(f"{self.vla_api_url}/continuous", timeout=2)
+            except Exception as e:
+                print(f"Could not stop continuous mode: {e}")
+        self.command_client.close()
+        if self.frame_listener is not None:
+            self.frame_listener.close()
+        self.tracer.close()
+        if self.frame_ring is not None:
+            self.frame_ring.close()
         self.root.destroy()
 
 if __name__ == "__main__":
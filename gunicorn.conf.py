@@ -0,0 +1,27 @@
+# gunicorn.conf.py
+# Production settings for the VLA server: gunicorn -c gunicorn.conf.py wsgi:app
+# (or just `python wsgi.py`).
+#
+# Every worker process has its own inference cache, scheduler, job table
+# and continuous-mode planner. Job ids are only known to the worker that
+# created them and VLA_MODEL_SESSIONS applies per worker, so keep a single
+# worker with several threads unless a sticky load balancer sits in front.
+import os
+
+bind = os.environ.get("VLA_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("VLA_WORKERS", 1))
+worker_class = "gthread"
+threads = int(os.environ.get("VLA_THREADS", 16))
+# gthread workers heartbeat from their main loop, so a long model call or
+# stream does not count against this.
+timeout = int(os.environ.get("VLA_WORKER_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+
+
+def post_worker_init(worker):
+    # Load the model once per worker, in the background, after the fork:
+    # threads started in the master would not survive it.
+    if os.environ.get("VLA_WARM_UP", "1") != "0":
+        from main import backend
+        backend.warm_up_async()
@@ -0,0 +1,66 @@
+# image_preprocess.py
+import io
+
+from lazy_modules import LazyModule
+
+Image = LazyModule("PIL.Image")
+
+# Gemma 3's vision encoder works on 896x896 inputs; anything larger is
+# downscaled by the model anyway and only costs transfer and prefill time.
+DEFAULT_SIZE = (896, 896)
+DEFAULT_QUALITY = 85
+
+
+def parse_crop(value):
+    # "left,top,right,bottom" as fractions of the frame (0-1) or pixels.
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        value = value.split(",")
+    crop = tuple(float(v) for v in value)
+    if len(crop) != 4:
+        raise ValueError("crop needs four values: left, top, right, bottom")
+    return crop
+
+
+def crop_box(crop, width, height):
+    if all(0.0 <= v <= 1.0 for v in crop):
+        crop = (crop[0] * width, crop[1] * height, crop[2] * width, crop[3] * height)
+    left, top, right, bottom = (int(round(v)) for v in crop)
+    left, top = max(0, left), max(0, top)
+    right, bottom = min(width, right), min(height, bottom)
+    if right <= left or bottom <= top:
+        raise ValueError(f"crop {crop} leaves an empty image")
+    return left, top, right, bottom
+
+
+def preprocess_image(image, size=DEFAULT_SIZE, crop=None, quality=DEFAULT_QUALITY):
+    # Accepts a path or encoded bytes and returns JPEG bytes no larger than
+    # size. Frames that already fit and need no crop are passed through
+    # without re-encoding.
+    if isinstance(image, str):
+        with open(image, "rb") as f:
+            data = f.read()
+    else:
+        data = bytes(image)
+
+    if not Image.available:
+        return data
+
+    with Image.open(io.BytesIO(data)) as img:
+        fits = img.width <= size[0] and img.height <= size[1]
+        if fits and crop is None and img.format == "JPEG":
+            return data
+
+        if crop is None:
+            # Lets the JPEG decoder skip straight to a reduced scale.
+            img.draft("RGB", size)
+        else:
+            img = img.crop(crop_box(crop, img.width, img.height))
+
+        img = img.convert("RGB")
+        img.thumbnail(size, Image.BILINEAR)
+
+        output = io.BytesIO()
+        img.save(output, format="JPEG", quality=quality)
+        return output.getvalue()
@@ -0,0 +1,182 @@
+# inference_cache.py
+import atexit
+import io
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from frame_store import write_atomic
+from lazy_modules import LazyModule
+
+Image = LazyModule("PIL.Image")
+
+HASH_SIZE = 8
+
+
+def image_hash(image, hash_size=HASH_SIZE):
+    # Difference hash: compare neighbouring pixels of a tiny greyscale
+    # thumbnail. Small lighting or sensor noise flips only a few bits.
+    if not Image.available:
+        return None
+    source = io.BytesIO(image) if isinstance(image, (bytes, bytearray)) else image
+    with Image.open(source) as img:
+        img.draft("L", (hash_size * 8, hash_size * 8))
+        pixels = img.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR).tobytes()
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+def normalize_prompt(prompt):
+    return re.sub(r"\s+", " ", prompt or "").strip().rstrip(".!?").lower()
+
+
+def normalize_context(context, step=0.5):
+    # Sensor context keys the cache with distances rounded to `step` meters,
+    # so a plan is reused while the robot holds still but not once it has
+    # closed in on an obstacle.
+    if not context:
+        return None
+    return re.sub(r"\d+(?:\.\d+)?", lambda m: f"{round(float(m.group(0)) / step) * step:g}", context)
+
+
+class InferenceCache:
+    def __init__(self, max_entries=256, ttl=300.0, max_distance=4, persist_path=None, save_delay=2.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.persist_path = persist_path
+        self.save_delay = save_delay
+
+        # (prompt, model, context, image hash) -> (value, created), least
+        # recently used first
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Inserts only mark the cache dirty; a timer writes the file once
+        # per save_delay, so requests never wait on the disk.
+        self.dirty = False
+        self.save_timer = None
+        self.save_lock = threading.Lock()
+
+        if persist_path:
+            self._load()
+            atexit.register(self.flush)
+
+    def _expired(self, created, now):
+        return self.ttl is not None and now - created > self.ttl
+
+    def _key(self, prompt, image_key, model, context):
+        # The image hash comes last; everything before it must match exactly.
+        return normalize_prompt(prompt), model, normalize_context(context), image_key
+
+    def get(self, prompt, image_key, model=None, context=None):
+        if image_key is None:
+            return None
+        key = self._key(prompt, image_key, model, context)
+        now = time.time()
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None and self.max_distance > 0:
+                best = self.max_distance + 1
+                for candidate, candidate_entry in self.entries.items():
+                    if candidate[:-1] != key[:-1]:
+                        continue
+                    distance = hamming_distance(candidate[-1], image_key)
+                    if distance < best:
+                        best, key, entry = distance, candidate, candidate_entry
+                if entry is not None:
+                    self.near_hits += 1
+
+            if entry is None or self._expired(entry[1], now):
+                if entry is not None:
+                    del self.entries[key]
+                    self.evictions += 1
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, prompt, image_key, value, model=None, context=None):
+        if image_key is None:
+            return
+        key = self._key(prompt, image_key, model, context)
+        with self.lock:
+            self.entries[key] = (value, time.time())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            if self.persist_path:
+                self.dirty = True
+                if self.save_timer is None:
+                    self.save_timer = threading.Timer(self.save_delay, self.flush)
+                    self.save_timer.daemon = True
+                    self.save_timer.start()
+
+    def flush(self):
+        # Writes pending inserts now; also runs at exit.
+        with self.save_lock:
+            with self.lock:
+                if self.save_timer is not None:
+                    self.save_timer.cancel()
+                    self.save_timer = None
+                if not self.dirty:
+                    return
+                self.dirty = False
+                data = [list(key) + [value, created] for key, (value, created) in self.entries.items()]
+            self._save(data)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def _save(self, data):
+        try:
+            write_atomic(self.persist_path, json.dumps(data).encode("utf-8"))
+        except OSError as e:
+            print(f"Error saving inference cache: {e}")
+
+    def _load(self):
+        try:
+            with open(self.persist_path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError as e:
+            print(f"Ignoring unreadable inference cache {self.persist_path}: {e}")
+            return
+
+        now = time.time()
+        for row in data[-self.max_entries:]:
+            # Rows written with an older key layout are dropped.
+            if len(row) != 6:
+                continue
+            *key, value, created = row
+            if not self._expired(created, now):
+                self.entries[tuple(key)] = (value, created)
@@ -0,0 +1,156 @@
+# jobs.py
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, key, client_id):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.clients = {client_id}
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.future = None
+        self.done_event = threading.Event()
+
+    def to_dict(self):
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+        if self.status == DONE:
+            data["result"] = self.result
+        elif self.error is not None:
+            data["error"] = self.error
+        return data
+
+
+class JobManager:
+    def __init__(self, max_workers=2, max_queued=32, retention=300.0):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vla-job")
+        self.max_queued = max_queued
+        self.retention = retention
+        self.lock = threading.Lock()
+
+        self.jobs = {}
+        # coalescing key -> job that has not finished yet
+        self.in_flight = {}
+        # client id -> id of the most recent job the client is waiting on
+        self.latest_by_client = {}
+
+        self.submitted = 0
+        self.coalesced = 0
+        self.cancelled = 0
+
+    def submit(self, key, client_id, fn, *args):
+        # Returns (job, coalesced). Identical requests share one job and one
+        # model call; a client's newer request supersedes its older one.
+        with self.lock:
+            self._purge()
+            self.submitted += 1
+
+            job = self.in_flight.get(key)
+            coalesced = job is not None
+            if job is None:
+                queued = sum(1 for j in self.in_flight.values() if j.status == QUEUED)
+                if queued >= self.max_queued:
+                    raise JobQueueFull(f"{queued} jobs already queued")
+                job = Job(key, client_id)
+                self.jobs[job.id] = job
+                self.in_flight[key] = job
+                job.future = self.executor.submit(self._run, job, fn, args)
+            else:
+                job.clients.add(client_id)
+                self.coalesced += 1
+
+            if client_id is not None:
+                previous = self.jobs.get(self.latest_by_client.get(client_id))
+                if previous is not None and previous is not job:
+                    self._release(previous, client_id)
+                self.latest_by_client[client_id] = job.id
+
+            return job, coalesced
+
+    def _release(self, job, client_id):
+        job.clients.discard(client_id)
+        # Only a job nobody is waiting for any more, and that has not reached
+        # the model yet, can be dropped.
+        if not job.clients and job.status == QUEUED and job.future.cancel():
+            self._finish(job, CANCELLED, error="Superseded by a newer request")
+            self.cancelled += 1
+
+    def _run(self, job, fn, args):
+        with self.lock:
+            if job.status != QUEUED:
+                return
+            job.status = RUNNING
+            job.started = time.time()
+
+        try:
+            result = fn(*args)
+        except Exception as e:
+            with self.lock:
+                self._finish(job, FAILED, error=str(e))
+            return
+
+        with self.lock:
+            self._finish(job, DONE, result=result)
+
+    def _finish(self, job, status, result=None, error=None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished = time.time()
+        if self.in_flight.get(job.key) is job:
+            del self.in_flight[job.key]
+        job.done_event.set()
+
+    def _purge(self):
+        cutoff = time.time() - self.retention
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job.status in FINISHED and job.finished < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+        if expired:
+            # Client ids come and go; forget those whose last job is gone.
+            self.latest_by_client = {client: job_id for client, job_id in self.latest_by_client.items()
+                                     if job_id in self.jobs}
+
+    def get(self, job_id, wait=0.0):
+        job = self.jobs.get(job_id)
+        if job is not None and wait > 0:
+            job.done_event.wait(wait)
+        return job
+
+    def stats(self):
+        with self.lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {
+                "submitted": self.submitted,
+                "coalesced": self.coalesced,
+                "cancelled": self.cancelled,
+                "by_status": counts,
+            }
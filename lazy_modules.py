@@ -0,0 +1,45 @@
+# lazy_modules.py
+# Optional and heavy dependencies are found once at startup, without
+# importing them, and imported on first use. This keeps processes that
+# never touch them (or not yet) from paying for NumPy, PIL or requests.
+import importlib
+import importlib.util
+import threading
+
+
+def module_available(name):
+    # find_spec locates the module without running it; for a submodule
+    # such as PIL.Image only the parent package is imported.
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class LazyModule:
+    # Stands in for `import name`: attribute access imports the module the
+    # first time and then forwards to it. Check `available` instead of
+    # comparing with None.
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+        self.available = module_available(name)
+
+    def load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "available" if self.available else "missing"
+        return f"<lazy module {self._name} ({state})>"
@@ -1,10 +1,125 @@
 # vla_server.py
-from flask import Flask, request, jsonify
-import ollama
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 import os
+import time
+import tempfile
+import hashlib
+import json
+import queue
+from collections import namedtuple
+import base64
+import binascii
+
+from frame_ring import RingReader, ring_name
+from frame_store import read_frame_index
+from command_channel import CommandClient, ChannelError
+from commands import parse_commands, CommandStream, Command
+from inference_cache import InferenceCache, image_hash, normalize_context, normalize_prompt
+from jobs import JobManager, JobQueueFull
+from image_preprocess import preprocess_image, parse_crop
+from scheduler import InferenceScheduler, SchedulerFull
+from backend import create_backend
+from tracing import Tracer, new_trace_id
+from metrics import Registry, SIZE_BUCKETS
+from perception import describe_obstacles
+from recording import SessionRecorder
+from continuous import ContinuousPlanner
 
 app = Flask(__name__)
 
+backend = create_backend()
+tracer = Tracer.from_env("server")
+recorder = SessionRecorder.from_env("server")
+
+frame_dir = os.environ.get("ROSBOT_FRAME_DIR", tempfile.gettempdir())
+frame_ring = RingReader(ring_name())
+command_client = None
+
+image_size = (int(os.environ.get("VLA_IMAGE_SIZE", 896)),) * 2
+image_quality = int(os.environ.get("VLA_JPEG_QUALITY", 85))
+image_crop = os.environ.get("VLA_IMAGE_CROP")
+obstacle_context = os.environ.get("VLA_OBSTACLE_CONTEXT", "1") != "0"
+
+inference_cache = InferenceCache(
+    max_entries=int(os.environ.get("VLA_CACHE_SIZE", 256)),
+    ttl=float(os.environ.get("VLA_CACHE_TTL", 300)),
+    max_distance=int(os.environ.get("VLA_CACHE_DISTANCE", 4)),
+    persist_path=os.environ.get("VLA_CACHE_FILE"),
+)
+
+scheduler = InferenceScheduler(
+    window=float(os.environ.get("VLA_BATCH_WINDOW", 0.02)),
+    max_sessions=int(os.environ.get("VLA_MODEL_SESSIONS", 2)),
+    max_queue_per_robot=int(os.environ.get("VLA_ROBOT_QUEUE", 16)),
+)
+
+job_manager = JobManager(
+    max_workers=int(os.environ.get("VLA_JOB_WORKERS", 8)),
+    max_queued=int(os.environ.get("VLA_JOB_QUEUE", 32)),
+)
+
+metrics = Registry()
+requests_total = metrics.counter(
+    "vla_requests_total", "HTTP requests handled", ("endpoint", "method", "status"))
+requests_in_flight = metrics.gauge(
+    "vla_requests_in_flight", "HTTP requests being handled, including open streams", ("endpoint",))
+request_seconds = metrics.histogram(
+    "vla_request_duration_seconds", "HTTP request duration until the response is complete", ("endpoint",))
+model_seconds = metrics.histogram(
+    "vla_model_latency_seconds", "Time spent in the model backend per call", ("backend", "model", "mode"))
+errors_total = metrics.counter("vla_errors_total", "Errors by type", ("type",))
+image_bytes = metrics.histogram(
+    "vla_image_bytes", "Size of images received and sent to the model", ("stage",), buckets=SIZE_BUCKETS)
+cache_lookups = metrics.counter("vla_cache_lookups_total", "Inference cache lookups", ("result",))
+cache_entries = metrics.gauge("vla_cache_entries", "Entries in the inference cache")
+scheduler_queue = metrics.gauge("vla_scheduler_queue_depth", "Requests waiting for a model session", ("model",))
+scheduler_sessions = metrics.gauge("vla_scheduler_active_sessions", "Model sessions running", ("model",))
+scheduler_rejected = metrics.counter("vla_scheduler_rejected_total", "Requests rejected by a full robot queue")
+jobs_total = metrics.gauge("vla_jobs", "Retained jobs by status", ("status",))
+continuous_plans = metrics.counter(
+    "vla_continuous_plans_total", "Continuous mode plans by outcome", ("outcome",))
+
+def collect_component_metrics():
+    cache = inference_cache.stats()
+    cache_entries.set(cache["entries"])
+    for result in ("hits", "near_hits", "misses"):
+        cache_lookups.set(cache[result], result=result)
+    
+    stats = scheduler.stats()
+    scheduler_rejected.set(stats["rejected"])
+    for model, model_stats in stats["models"].items():
+        scheduler_queue.set(model_stats["queue_depth"], model=model)
+        scheduler_sessions.set(model_stats["active_sessions"], model=model)
+    
+    by_status = job_manager.stats()["by_status"]
+    for status in ("queued", "running", "done", "failed", "cancelled"):
+        jobs_total.set(by_status.get(status, 0), status=status)
+    
+    continuous = planner.stats()
+    for outcome in ("started_idle", "standby_sent", "standby_used", "discarded_stale"):
+        continuous_plans.set(continuous[outcome], outcome=outcome)
+
+metrics.add_collector(collect_component_metrics)
+
+ERROR_TYPES = {
+    ValueError: "invalid_image",
+    ChannelError: "dispatch",
+    SchedulerFull: "busy",
+    JobQueueFull: "busy",
+}
+
+def count_error(error_type):
+    errors_total.inc(type=error_type)
+
+def get_command_client():
+    global command_client
+    if command_client is None:
+        command_client = CommandClient()
+    return command_client
+
+def read_ring_frame(frame_seq=None):
+    return frame_ring.read(frame_seq)
+
 def go_ahead(distance_meters):
     return f"go_ahead({distance_meters})"
 
@@ -20,85 +135,532 @@ def turn_right(angle_degrees):
 def change_speed(speed_percent):
     return f"change_speed({speed_percent})"
 
-def get_action_plan(image_path, user_prompt=""):
-    image_path = image_path.strip()
-    if (image_path.startswith('"') and image_path.endswith('"')) or \
-       (image_path.startswith("'") and image_path.endswith("'")):
-        image_path = image_path[1:-1]
-    
-    if not os.path.exists(image_path):
-        return f"Error: Image path does not exist: {image_path}"
+def validate_image(image):
+    # Returns (image, error) with quotes stripped from paths.
+    if isinstance(image, str):
+        image = image.strip()
+        if (image.startswith('"') and image.endswith('"')) or \
+           (image.startswith("'") and image.endswith("'")):
+            image = image[1:-1]
+        
+        if not os.path.exists(image):
+            return None, f"Error: Image path does not exist: {image}"
+    return image, None
+
+def get_action_plan(image, user_prompt="", model=None, trace_id=None, context=None):
+    image, error = validate_image(image)
+    if error:
+        count_error("image_not_found")
+        return error
     
-    if not user_prompt:
-        user_prompt = "Based on this image, generate robot commands for the most logical task."
+    start = time.perf_counter()
+    try:
+        with tracer.span("server.model", trace_id, backend=backend.name):
+            return backend.chat(image, user_prompt, model, context)
+    except Exception as e:
+        count_error("model")
+        return f"Error processing image: {str(e)}"
+    finally:
+        model_seconds.observe(time.perf_counter() - start, backend=backend.name,
+                              model=model or backend.model, mode="chat")
+
+def stream_action_plan(image, user_prompt="", model=None, context=None):
+    # Yields the model output in chunks as it is generated.
+    image, error = validate_image(image)
+    if error:
+        raise ValueError(error)
     
-    prompt = f"""You are a Vision-Language-Action (VLA) model controlling a robot. Based on the image and the user's instruction: "{user_prompt}", generate a sequence of robot commands.
+    yield from backend.stream(image, user_prompt, model, context)
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    g.metrics_start = time.perf_counter()
+    requests_in_flight.inc(endpoint=g.metrics_endpoint)
+
+def finish_request_metrics(endpoint, start):
+    requests_in_flight.dec(endpoint=endpoint)
+    request_seconds.observe(time.perf_counter() - start, endpoint=endpoint)
+
+@app.after_request
+def count_request(response):
+    endpoint = g.pop("metrics_endpoint", "unmatched")
+    requests_total.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    # call_on_close fires once the body has been fully sent, so streamed
+    # responses stay in flight until their last line.
+    start = g.metrics_start
+    response.call_on_close(lambda: finish_request_metrics(endpoint, start))
+    return response
+
+@app.teardown_request
+def count_failed_request(exc):
+    # Flask turns an unhandled exception into a 500 response and still runs
+    # after_request for it, so the request itself has been counted there.
+    if exc is not None:
+        count_error("unhandled")
+    # Only when the exception propagates (PROPAGATE_EXCEPTIONS, testing) is
+    # after_request skipped.
+    endpoint = g.pop("metrics_endpoint", None)
+    if endpoint is None:
+        return
+    requests_total.inc(endpoint=endpoint, method=request.method, status=500)
+    finish_request_metrics(endpoint, g.metrics_start)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_api():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
-Available functions:
-- go_ahead(distance_meters): Move forward by the specified distance
-- go_back(distance_meters): Move backward by the specified distance
-- turn_left(angle_degrees): Turn left by the specified angle in degrees
-- turn_right(angle_degrees): Turn right by the specified angle in degrees
-- change_speed(speed_percent): Change the robot's movement speed
+@app.route('/health', methods=['GET'])
+def health_check():
+    return jsonify({
+        "status": "up",
+        "service": "VLA Robot Command Service",
+        "cache": inference_cache.stats(),
+        "jobs": job_manager.stats(),
+        "scheduler": scheduler.stats(),
+        "backend": backend.stats(),
+        "continuous": planner.stats(),
+    })
 
-Provide your response as a list of function calls with appropriate parameters. For example:
-[
-    "go_ahead(1.5)",
-    "turn_left(45)",
-]
+def request_data():
+    # JSON body, or a multipart form whose 'image' part carries the frame.
+    if request.files or request.form:
+        data = request.form.to_dict()
+        if 'image' in request.files:
+            data['image_bytes'] = request.files['image'].read()
+        if 'frame_seq' in data:
+            data['frame_seq'] = int(data['frame_seq']) if data['frame_seq'].isdigit() else None
+        data['dispatch'] = data.get('dispatch', "").lower() in ("1", "true", "yes")
+        return data
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else None
 
-Return ONLY the command list with NO explanations or additional text.
-This will be interpreted as a custom language model for robot control.
-"""
+def locate_image(data):
+    # Returns (image, frame_seq, frame_meta, error) where image is a path or
+    # encoded bytes and frame_meta is what the controller stored with the
+    # frame (trace id, obstacle summary).
+    if data.get('image_bytes'):
+        return data['image_bytes'], None, None, None
+    
+    if data.get('image_base64'):
+        encoded = data['image_base64']
+        if not isinstance(encoded, str):
+            return None, None, None, ({"error": "image_base64 must be a base64 string"}, 400)
+        if encoded.startswith("data:"):
+            encoded = encoded.split(",", 1)[-1]
+        try:
+            return base64.b64decode(encoded, validate=True), None, None, None
+        except (binascii.Error, ValueError):
+            return None, None, None, ({"error": "image_base64 is not valid base64"}, 400)
+    
+    if data.get('image_path'):
+        if not isinstance(data['image_path'], str):
+            return None, None, None, ({"error": "image_path must be a string"}, 400)
+        image = data['image_path'].strip()
+        if (image.startswith('"') and image.endswith('"')) or \
+           (image.startswith("'") and image.endswith("'")):
+            image = image[1:-1]
+        return image, None, None, None
+    
+    if 'frame_seq' in data:
+        frame = read_ring_frame(data['frame_seq'])
+        if frame is not None:
+            return frame.data, frame.seq, frame.meta, None
+        index = read_frame_index(frame_dir)
+        if index is not None:
+            return index['path'], index['seq'], index.get('meta'), None
+        return None, None, None, ({"error": "No frame available from the robot"}, 404)
+    
+    return None, None, None, ({"error": "An image upload, image_base64, image_path or frame_seq is required"}, 400)
+
+def resolve_image(data):
+    # Locates the frame and shrinks it to the model's input size before it
+    # is hashed, cached or sent to the model.
+    image, frame_seq, frame_meta, error = locate_image(data)
+    if error:
+        return None, None, None, error
+    if not isinstance(image, str):
+        image_bytes.observe(len(image), stage="received")
     
     try:
-        response = ollama.chat(
-            model='gemma3:4b',
-            messages=[
-                {
-                    'role': 'user',
-                    'content': prompt,
-                    'images': [image_path]
-                }
-            ]
-        )
-        
-        if isinstance(response, dict):
-            if 'message' in response and 'content' in response['message']:
-                return response['message']['content']
-            elif 'content' in response:
-                return response['content']
-            else:
-                return str(response)
-        else:
-            return response.content if hasattr(response, 'content') else str(response)
+        crop = parse_crop(data.get('crop', image_crop))
+        image = preprocess_image(image, image_size, crop, image_quality)
+    except FileNotFoundError:
+        return None, None, None, ({"error": f"Error: Image path does not exist: {image}"}, 400)
+    except (OSError, ValueError) as e:
+        return None, None, None, ({"error": f"Invalid image: {str(e)}"}, 400)
+    
+    return image, frame_seq, frame_meta, None
+
+def safe_image_hash(image):
+    try:
+        return image_hash(image)
     except Exception as e:
-        return f"Error processing image: {str(e)}"
+        print(f"Could not hash image for the inference cache: {e}")
+        return None
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    return jsonify({"status": "up", "service": "VLA Robot Command Service"})
+PlanRequest = namedtuple("PlanRequest", [
+    "image", "user_prompt", "image_key", "frame_seq", "dispatch", "robot_id", "model", "priority",
+    "trace_id", "context",
+])
+
+def build_plan_request(data):
+    # Returns (plan request, error) from a parsed request body.
+    start = time.time()
+    image, frame_seq, frame_meta, error = resolve_image(data)
+    if error:
+        count_error("no_frame" if error[1] == 404 else "invalid_image")
+        return None, error
+    image_bytes.observe(len(image), stage="model_input")
+    frame_meta = frame_meta or {}
+    
+    # A trace id sent by the client wins over the frame's, so a client can
+    # follow an uploaded image too.
+    trace_id = str(data.get('trace_id') or frame_meta.get('trace_id') or new_trace_id())
+    
+    # Obstacle distances go into the prompt as text; clients uploading a
+    # frame pass the summary the controller stored with it.
+    context = None
+    obstacles = data.get('obstacles') or frame_meta.get('obstacles')
+    if obstacles and not isinstance(obstacles, (dict, str)):
+        count_error("bad_request")
+        return None, ({"error": "obstacles must be an object or a string"}, 400)
+    if obstacle_context and obstacles:
+        context = obstacles if isinstance(obstacles, str) else describe_obstacles(obstacles)
+    tracer.record("server.preprocess", trace_id, start, image_bytes=len(image))
+    
+    user_prompt = data.get('user_prompt') or ""
+    if not isinstance(user_prompt, str):
+        count_error("bad_request")
+        return None, ({"error": "user_prompt must be a string"}, 400)
+    
+    try:
+        priority = int(data.get('priority', 0))
+    except (TypeError, ValueError):
+        count_error("bad_request")
+        return None, ({"error": "priority must be an integer"}, 400)
+    
+    plan_request = PlanRequest(
+        image=image,
+        user_prompt=user_prompt,
+        image_key=safe_image_hash(image),
+        frame_seq=frame_seq,
+        dispatch=bool(data.get('dispatch', False)),
+        robot_id=str(data.get('robot_id') or data.get('client_id') or request.remote_addr),
+        model=data.get('model') or backend.model,
+        priority=priority,
+        trace_id=trace_id,
+        context=context,
+    )
+    return plan_request, None
+
+def record_prompt(plan_request, endpoint):
+    # Stores the model input and the request with it, for replay.py.
+    if not recorder.enabled:
+        return
+    frame = recorder.frame(plan_request.image, trace_id=plan_request.trace_id,
+                           frame_seq=plan_request.frame_seq)
+    recorder.event(
+        "prompt", trace_id=plan_request.trace_id, endpoint=endpoint, frame=frame,
+        frame_seq=plan_request.frame_seq, user_prompt=plan_request.user_prompt,
+        context=plan_request.context, robot_id=plan_request.robot_id, model=plan_request.model,
+        priority=plan_request.priority, dispatch=plan_request.dispatch)
+
+def record_output(trace_id, response, status):
+    if not recorder.enabled:
+        return
+    recorder.event(
+        "output", trace_id=trace_id, status=status, raw=response.get("raw"),
+        commands=response.get("commands"), errors=response.get("errors"),
+        error=response.get("error"), cached=response.get("cached"))
+
+def plan_commands(plan_request):
+    # Returns (response body, status code) for a /process-image style request.
+    user_prompt = plan_request.user_prompt
+    trace_id = plan_request.trace_id
+    plan = inference_cache.get(user_prompt, plan_request.image_key,
+                               plan_request.model, plan_request.context)
+    cached = plan is not None
+    if not cached:
+        try:
+            # Covers the wait for a model session as well as the call itself.
+            with tracer.span("server.schedule", trace_id, robot_id=plan_request.robot_id):
+                plan = scheduler.run(
+                    get_action_plan, plan_request.image, user_prompt, plan_request.model, trace_id,
+                    plan_request.context,
+                    robot_id=plan_request.robot_id, model=plan_request.model, priority=plan_request.priority)
+        except SchedulerFull as e:
+            count_error("busy")
+            return {"error": f"Server busy: {str(e)}", "trace_id": trace_id}, 503
+    
+    if isinstance(plan, str) and plan.startswith("Error"):
+        return {"error": plan, "trace_id": trace_id}, 400
+    
+    with tracer.span("server.parse", trace_id, cached=cached):
+        commands, errors = parse_commands(plan)
+    if errors:
+        count_error("invalid_output")
+        return {
+            "error": "Model output contains invalid commands",
+            "errors": [e._asdict() for e in errors],
+            "raw": plan,
+            "trace_id": trace_id,
+        }, 422
+    if not cached:
+        inference_cache.put(user_prompt, plan_request.image_key, plan,
+                            plan_request.model, plan_request.context)
+    
+    commands = [c.to_dict() for c in commands]
+    response = {"commands": commands, "raw": plan, "cached": cached, "trace_id": trace_id}
+    if plan_request.frame_seq is not None:
+        response["frame_seq"] = plan_request.frame_seq
+    
+    if plan_request.dispatch:
+        try:
+            with tracer.span("server.dispatch", trace_id, commands=len(commands)):
+                response["dispatched"] = get_command_client().send(commands, trace_id=trace_id)
+        except ChannelError as e:
+            count_error("dispatch")
+            response["error"] = f"Error dispatching commands: {str(e)}"
+            return response, 502
+    
+    return response, 200
 
 @app.route('/process-image', methods=['POST'])
 def process_image_api():
-    if not request.json:
+    data = request_data()
+    if not data:
         return jsonify({"error": "Invalid JSON payload"}), 400
-        
-    data = request.json
     
-    if 'image_path' not in data or not data['image_path']:
-        return jsonify({"error": "Image path is required"}), 400
+    start = time.time()
+    plan_request, error = build_plan_request(data)
+    if error:
+        return jsonify(error[0]), error[1]
+    record_prompt(plan_request, request.path)
+    
+    response, status = plan_commands(plan_request)
+    record_output(plan_request.trace_id, response, status)
+    tracer.record("server.request", plan_request.trace_id, start, endpoint="/process-image", status=status)
+    return jsonify(response), status
+
+STREAM_END = object()
+
+def scheduled_stream(plan_request):
+    # Runs the streaming model call inside a scheduler session and hands
+    # the chunks over to the HTTP response through a queue.
+    chunks = queue.Queue()
+    
+    def produce():
+        start = time.perf_counter()
+        try:
+            with tracer.span("server.model", plan_request.trace_id, backend=backend.name, stream=True):
+                for chunk in stream_action_plan(plan_request.image, plan_request.user_prompt,
+                                                plan_request.model, plan_request.context):
+                    chunks.put(chunk)
+        finally:
+            model_seconds.observe(time.perf_counter() - start, backend=backend.name,
+                                  model=plan_request.model, mode="stream")
+            chunks.put(STREAM_END)
+    
+    future = scheduler.submit(
+        produce, robot_id=plan_request.robot_id, model=plan_request.model, priority=plan_request.priority)
+    while True:
+        chunk = chunks.get()
+        if chunk is STREAM_END:
+            break
+        yield chunk
+    future.result()
+
+def stream_commands(plan_request):
+    # Yields one event dict per command as soon as it has been generated.
+    # With dispatch, the first command replaces the robot's queue and the
+    # rest are appended, so motion starts before generation has finished.
+    def send(command, index):
+        mode = "replace" if index == 0 else "append"
+        with tracer.span("server.dispatch", trace_id, index=index):
+            return get_command_client().send([command.to_dict()], mode=mode, trace_id=trace_id)
+    
+    start = time.time()
+    trace_id = plan_request.trace_id
+    user_prompt = plan_request.user_prompt
+    cached = inference_cache.get(user_prompt, plan_request.image_key,
+                                 plan_request.model, plan_request.context)
+    if cached is not None:
+        chunks = [cached]
+    else:
+        chunks = scheduled_stream(plan_request)
+    
+    parser = CommandStream()
+    index = 0
+    commands = []
+    errors = []
+    try:
+        for chunk in chunks:
+            for item in parser.feed(chunk):
+                if not isinstance(item, Command):
+                    count_error("invalid_output")
+                    errors.append(item._asdict())
+                    yield {"type": "error", "error": errors[-1]}
+                    continue
+                event = {"type": "command", "index": index, "command": item.to_dict()}
+                commands.append(event["command"])
+                if index == 0:
+                    tracer.record("server.first_command", trace_id, start)
+                if plan_request.dispatch:
+                    event["dispatched"] = send(item, index)
+                index += 1
+                yield event
+        for error in parser.finish():
+            count_error("invalid_output")
+            errors.append(error._asdict())
+            yield {"type": "error", "error": errors[-1]}
+    except (ValueError, ChannelError, SchedulerFull) as e:
+        count_error(next(name for t, name in ERROR_TYPES.items() if isinstance(e, t)))
+        record_output(trace_id, {"raw": parser.raw, "commands": commands, "error": str(e)}, 200)
+        yield {"type": "error", "error": {"message": str(e)}}
+        return
+    except Exception as e:
+        count_error("model")
+        error = f"Error processing image: {str(e)}"
+        record_output(trace_id, {"raw": parser.raw, "commands": commands, "error": error}, 200)
+        yield {"type": "error", "error": {"message": error}}
+        return
+    
+    if cached is None and not parser.errors and parser.count:
+        inference_cache.put(user_prompt, plan_request.image_key, parser.raw,
+                            plan_request.model, plan_request.context)
+    
+    done = {"type": "done", "count": index, "raw": parser.raw, "cached": cached is not None,
+            "trace_id": trace_id}
+    if plan_request.frame_seq is not None:
+        done["frame_seq"] = plan_request.frame_seq
+    tracer.record("server.stream", trace_id, start, commands=index)
+    record_output(trace_id, {"raw": parser.raw, "commands": commands, "cached": cached is not None,
+                             "errors": errors or None}, 200)
+    yield done
+
+@app.route('/process-image/stream', methods=['POST'])
+def process_image_stream_api():
+    data = request_data()
+    if not data:
+        return jsonify({"error": "Invalid JSON payload"}), 400
+    
+    plan_request, error = build_plan_request(data)
+    if error:
+        return jsonify(error[0]), error[1]
+    record_prompt(plan_request, request.path)
+    
+    lines = (json.dumps(event) + "\n" for event in stream_commands(plan_request))
+    return Response(stream_with_context(lines), mimetype="application/x-ndjson")
+
+def run_job(plan_request):
+    response, status = plan_commands(plan_request)
+    record_output(plan_request.trace_id, response, status)
+    response["status_code"] = status
+    return response
+
+@app.route('/jobs', methods=['POST'])
+def submit_job_api():
+    data = request_data()
+    if not data:
+        return jsonify({"error": "Invalid JSON payload"}), 400
     
-    image_path = data['image_path']
-    user_prompt = data.get('user_prompt', "")
+    plan_request, error = build_plan_request(data)
+    if error:
+        return jsonify(error[0]), error[1]
+    record_prompt(plan_request, request.path)
     
-    commands = get_action_plan(image_path, user_prompt)
+    image_id = plan_request.image_key
+    if image_id is None:
+        image_id = hashlib.sha1(plan_request.image).hexdigest()
+    key = (normalize_prompt(plan_request.user_prompt), image_id, plan_request.model,
+           normalize_context(plan_request.context), plan_request.dispatch)
     
-    if isinstance(commands, str) and commands.startswith("Error"):
-        return jsonify({"error": commands}), 400
+    try:
+        job, coalesced = job_manager.submit(key, data.get('client_id'), run_job, plan_request)
+    except JobQueueFull as e:
+        count_error("busy")
+        return jsonify({"error": f"Server busy: {str(e)}"}), 503
+    
+    response = job.to_dict()
+    response["coalesced"] = coalesced
+    response["trace_id"] = plan_request.trace_id
+    return jsonify(response), 202
+
+def continuous_frame(session):
+    # Plan request for the newest frame from the robot.
+    plan_request, error = build_plan_request(dict(session, frame_seq=None))
+    return plan_request
+
+def continuous_plan(plan_request):
+    record_prompt(plan_request, "/continuous")
+    with tracer.span("server.continuous", plan_request.trace_id):
+        response, status = plan_commands(plan_request)
+    record_output(plan_request.trace_id, response, status)
+    if status != 200:
+        print(f"Continuous mode: {response.get('error')}")
+        return None
+    return response["commands"]
+
+def continuous_dispatch(commands, mode, trace_id):
+    with tracer.span("server.dispatch", trace_id, mode=mode, commands=len(commands)):
+        get_command_client().send(commands, mode=mode, trace_id=trace_id)
+
+planner = ContinuousPlanner(
+    continuous_frame, continuous_plan, continuous_dispatch,
+    lambda: get_command_client().status(),
+    interval=float(os.environ.get("VLA_CONTINUOUS_INTERVAL", 0.2)),
+    max_distance=int(os.environ.get("VLA_CONTINUOUS_DISTANCE", 10)),
+)
+
+@app.route('/continuous', methods=['POST'])
+def start_continuous_api():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data.get('user_prompt'):
+        return jsonify({"error": "user_prompt is required"}), 400
+    
+    session = {
+        "user_prompt": data['user_prompt'],
+        "robot_id": str(data.get('robot_id') or "continuous"),
+        "model": data.get('model') or backend.model,
+        "priority": data.get('priority', 0),
+    }
+    if data.get('crop'):
+        session["crop"] = data['crop']
+    
+    # Plans come from the robot's own frames, so fail now if this server
+    # cannot read them.
+    plan_request, error = build_plan_request(dict(session, frame_seq=None))
+    if error:
+        return jsonify(error[0]), error[1]
+    
+    planner.start(session)
+    return jsonify(planner.stats())
+
+@app.route('/continuous', methods=['GET'])
+def continuous_status_api():
+    return jsonify(planner.stats())
+
+@app.route('/continuous', methods=['DELETE'])
+def stop_continuous_api():
+    stopped = planner.stop()
+    return jsonify(dict(planner.stats(), stopped=stopped))
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job_api(job_id):
+    try:
+        wait = min(float(request.args.get('wait', 0)), 60.0)
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
     
-    return jsonify({"commands": commands})
+    job = job_manager.get(job_id, wait)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    return jsonify(job.to_dict())
 
 if __name__ == '__main__':
+    if os.environ.get("VLA_WARM_UP", "1") != "0":
+        backend.warm_up_async()
     print("Starting VLA Robot Command Server on http://0.0.0.0:5000")
-    app.run(host='0.0.0.0', port=5000)
+    print("This is Flask's development server; run wsgi.py in production")
+    app.run(host='0.0.0.0', port=5000, threaded=True)
@@ -0,0 +1,242 @@
+# metrics.py
+# Minimal Prometheus text-format metrics, without a client library. The
+# server's metrics are shared between request threads and take a lock;
+# ControllerCounters is written only from the control loop and so needs
+# none.
+import math
+import threading
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (16e3, 64e3, 128e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6)
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+def format_sample(name, value, labels=None):
+    return f"{name}{format_labels(labels)} {format_value(value)}"
+
+
+def format_header(name, kind, help_text):
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key):
+        return dict(zip(self.labelnames, key))
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, value, self._labels(key)) for key, value in sorted(self.values.items())]
+
+    def render(self):
+        lines = format_header(self.name, self.kind, self.help)
+        lines.extend(format_sample(*sample) for sample in self.samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        # For totals another component already keeps, copied at scrape time.
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self.values[key] = (counts, total + value)
+
+    def samples(self):
+        with self.lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self.values.items())
+        samples = []
+        for key, (counts, total) in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", cumulative, dict(labels, le=format_value(bound))))
+            samples.append((f"{self.name}_sum", total, labels))
+            samples.append((f"{self.name}_count", cumulative, labels))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def add_collector(self, collect):
+        # collect() runs before every render, for gauges that are cheaper to
+        # read from their owner on demand than to keep updated.
+        self.collectors.append(collect)
+
+    def render(self):
+        for collect in self.collectors:
+            collect()
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class ControllerCounters:
+    # Updated only from the control loop thread; readers may see a value
+    # that is one step old, which is fine for monitoring and needs no lock.
+    def __init__(self, step_budget):
+        self.step_budget = step_budget
+        self.steps = 0
+        self.overruns = 0
+        self.step_time_total = 0.0
+        self.step_time_max = 0.0
+        self.batches_received = 0
+        self.commands_received = 0
+        self.commands_executed = 0
+        self.command_errors = 0
+        self.queue_length = 0
+        self.queue_length_max = 0
+
+    def step(self, seconds):
+        # seconds is the controller's own work between two simulation steps.
+        self.steps += 1
+        self.step_time_total += seconds
+        if seconds > self.step_time_max:
+            self.step_time_max = seconds
+        if seconds > self.step_budget:
+            self.overruns += 1
+
+    def batch(self, commands, errors):
+        self.batches_received += 1
+        self.commands_received += commands
+        self.command_errors += errors
+
+    def executed(self):
+        self.commands_executed += 1
+
+    def queue(self, length):
+        self.queue_length = length
+        if length > self.queue_length_max:
+            self.queue_length_max = length
+
+    def snapshot(self):
+        return {
+            "steps": self.steps,
+            "overruns": self.overruns,
+            "step_mean_ms": round(self.step_time_total * 1000 / self.steps, 3) if self.steps else 0.0,
+            "step_max_ms": round(self.step_time_max * 1000, 3),
+            "batches_received": self.batches_received,
+            "commands_received": self.commands_received,
+            "commands_executed": self.commands_executed,
+            "command_errors": self.command_errors,
+            "queue_length": self.queue_length,
+            "queue_length_max": self.queue_length_max,
+        }
+
+    def render(self, capture=None):
+        # Prometheus text format, e.g. for node_exporter's textfile collector.
+        samples = [
+            ("rosbot_steps_total", "counter", "Control steps run", self.steps),
+            ("rosbot_step_overruns_total", "counter",
+             "Control steps whose own work took longer than TIME_STEP", self.overruns),
+            ("rosbot_step_seconds_total", "counter", "Time spent in the control loop between steps",
+             self.step_time_total),
+            ("rosbot_step_seconds_max", "gauge", "Longest control step", self.step_time_max),
+            ("rosbot_command_batches_total", "counter", "Command batches received", self.batches_received),
+            ("rosbot_commands_received_total", "counter", "Commands received", self.commands_received),
+            ("rosbot_commands_executed_total", "counter", "Commands started", self.commands_executed),
+            ("rosbot_command_errors_total", "counter", "Invalid commands rejected", self.command_errors),
+            ("rosbot_command_queue_length", "gauge", "Commands waiting to run", self.queue_length),
+        ]
+        if capture:
+            samples.extend([
+                ("rosbot_frames_captured_total", "counter", "Frames grabbed from the camera", capture["captured"]),
+                ("rosbot_frames_published_total", "counter", "Frames encoded and published", capture["published"]),
+                ("rosbot_frames_dropped_total", "counter", "Frames skipped because encoders were busy or stale",
+                 capture["dropped_busy"] + capture["dropped_stale"]),
+                ("rosbot_capture_grab_seconds_mean", "gauge", "Mean camera grab time",
+                 capture["capture"]["mean_ms"] / 1000),
+                ("rosbot_capture_encode_seconds_mean", "gauge", "Mean frame encode and store time",
+                 capture["encode"]["mean_ms"] / 1000),
+            ])
+        lines = []
+        for name, kind, help_text, value in samples:
+            lines.extend(format_header(name, kind, help_text))
+            lines.append(format_sample(name, value))
+        return "\n".join(lines) + "\n"
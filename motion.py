@@ -0,0 +1,162 @@
+# motion.py
+import math
+
+WHEEL_RADIUS = 0.0425
+TRACK_WIDTH = 0.192
+DISTANCE_TOLERANCE = 0.005
+ANGLE_TOLERANCE = math.radians(1.0)
+SLOWDOWN_DISTANCE = 0.10
+SLOWDOWN_ANGLE = math.radians(15.0)
+MIN_SPEED_SCALE = 0.2
+
+
+def angle_difference(a, b):
+    return (a - b + math.pi) % (2 * math.pi) - math.pi
+
+
+class Odometry:
+    def __init__(self, left, right, heading, time):
+        # left/right are mean wheel angles in radians, heading is the compass
+        # bearing in radians (None when the compass has no reading yet).
+        self.left = left
+        self.right = right
+        self.heading = heading
+        self.time = time
+
+    @property
+    def valid(self):
+        return not (math.isnan(self.left) or math.isnan(self.right))
+
+
+class Motion:
+    name = "motion"
+
+    def __init__(self, speed, timeout):
+        self.speed = speed
+        self.timeout = timeout
+        self.start_time = None
+
+    def start(self, odometry):
+        self.start_time = odometry.time
+
+    def update(self, odometry):
+        # Returns (left, right) wheel velocities, or None once the target has
+        # been reached.
+        raise NotImplementedError
+
+    def timed_out(self, odometry):
+        return odometry.time - self.start_time > self.timeout
+
+    def scaled_speed(self, remaining, slowdown):
+        return self.speed * min(1.0, max(MIN_SPEED_SCALE, remaining / slowdown))
+
+
+class Drive(Motion):
+    def __init__(self, distance, speed):
+        self.direction = 1 if distance >= 0 else -1
+        self.distance = abs(distance)
+        expected = self.distance / max(abs(speed) * WHEEL_RADIUS, 1e-3)
+        super().__init__(abs(speed), 2.0 + 3.0 * expected)
+        self.name = "go_ahead" if self.direction > 0 else "go_back"
+        self.start_left = None
+        self.start_right = None
+        self.travelled = 0.0
+
+    def start(self, odometry):
+        super().start(odometry)
+        self.start_left = odometry.left
+        self.start_right = odometry.right
+
+    def update(self, odometry):
+        left = abs(odometry.left - self.start_left)
+        right = abs(odometry.right - self.start_right)
+        self.travelled = (left + right) / 2 * WHEEL_RADIUS
+
+        remaining = self.distance - self.travelled
+        if remaining <= DISTANCE_TOLERANCE:
+            return None
+
+        speed = self.direction * self.scaled_speed(remaining, SLOWDOWN_DISTANCE)
+        return speed, speed
+
+
+class Turn(Motion):
+    # Skid-steer turning is hard to model from wheel angles alone, so turns
+    # are measured on the IMU compass; wheel odometry is only a fallback for
+    # steps without a compass reading.
+    def __init__(self, angle_degrees, speed):
+        self.direction = 1 if angle_degrees >= 0 else -1
+        self.angle = math.radians(abs(angle_degrees))
+        expected = self.angle / max(abs(speed) * WHEEL_RADIUS / (TRACK_WIDTH / 2), 1e-3)
+        super().__init__(abs(speed), 2.0 + 4.0 * expected)
+        self.name = "turn_left" if self.direction > 0 else "turn_right"
+        self.last = None
+        self.turned = 0.0
+
+    def start(self, odometry):
+        super().start(odometry)
+        self.last = odometry
+
+    def update(self, odometry):
+        last = self.last
+        if odometry.heading is not None and last.heading is not None:
+            self.turned += abs(angle_difference(odometry.heading, last.heading))
+        else:
+            wheels = (abs(odometry.left - last.left) + abs(odometry.right - last.right)) / 2
+            self.turned += wheels * WHEEL_RADIUS / (TRACK_WIDTH / 2)
+        self.last = odometry
+
+        remaining = self.angle - self.turned
+        if remaining <= ANGLE_TOLERANCE:
+            return None
+
+        speed = self.direction * self.scaled_speed(remaining, SLOWDOWN_ANGLE)
+        return -speed, speed
+
+
+class MotionExecutor:
+    def __init__(self, set_motor_speeds, stop):
+        self.set_motor_speeds = set_motor_speeds
+        self.stop = stop
+        self.current = None
+        self.started = False
+
+    @property
+    def active(self):
+        return self.current is not None
+
+    def start(self, motion, odometry):
+        self.cancel()
+        self.current = motion
+        self.started = False
+        self.tick(odometry)
+
+    def tick(self, odometry):
+        # Advances the current motion by one control step and returns True
+        # when it has just finished.
+        motion = self.current
+        if motion is None or not odometry.valid:
+            return False
+
+        if not self.started:
+            motion.start(odometry)
+            self.started = True
+
+        speeds = motion.update(odometry)
+        if speeds is not None and motion.timed_out(odometry):
+            print(f"{motion.name} timed out before reaching its target")
+            speeds = None
+
+        if speeds is None:
+            self.stop()
+            self.current = None
+            return True
+
+        self.set_motor_speeds(*speeds)
+        return False
+
+    def cancel(self):
+        if self.current is not None:
+            print(f"Preempting {self.current.name}")
+            self.current = None
+            self.stop()
@@ -0,0 +1,109 @@
+# perception.py
+# Turns the lidar, depth camera and range sensors into a small obstacle
+# summary the controller can attach to every frame, so the model knows how
+# much free space there is around the robot.
+import math
+
+from lazy_modules import LazyModule
+
+# The server only needs describe_obstacles, so NumPy is imported by the
+# first Perception.
+np = LazyModule("numpy")
+
+HAS_NUMPY = np.available
+
+# Lidar sectors counter-clockwise from straight ahead, 45 degrees each.
+SECTORS = ("front", "front-left", "left", "back-left", "back", "back-right", "right", "front-right")
+DEPTH_COLUMNS = ("left", "center", "right")
+# Rows of the depth image to look at; the rest is mostly floor and ceiling.
+DEPTH_BAND = (0.35, 0.65)
+RANGE_SENSORS = ("front-left", "rear-left", "front-right", "rear-right")
+
+
+def range_array(device, count):
+    # Webots returns range images as a list, or as a float32 buffer on
+    # releases that accept data_type; the buffer avoids building a list.
+    try:
+        data = device.getRangeImage(data_type="buffer")
+        return np.frombuffer(data, dtype=np.float32, count=count)
+    except TypeError:
+        return np.asarray(device.getRangeImage(), dtype=np.float32)[:count]
+
+
+def clean_ranges(ranges, max_range):
+    # inf (no return), nan and zero readings all mean nothing within range.
+    return np.where(np.isfinite(ranges) & (ranges > 0), ranges, max_range)
+
+
+class Perception:
+    def __init__(self, lidar=None, depth_camera=None, range_sensors=()):
+        if not HAS_NUMPY:
+            raise RuntimeError("perception needs numpy")
+        self.lidar = lidar
+        self.depth_camera = depth_camera
+        self.range_sensors = list(range_sensors)
+        self.summary = None
+
+        if lidar is not None:
+            self.lidar_points = lidar.getHorizontalResolution()
+            self.lidar_max = lidar.getMaxRange()
+            fov = lidar.getFov()
+            # Webots scans clockwise starting from the left edge of the
+            # field of view; angles here are counter-clockwise from ahead.
+            angles = fov / 2 - np.arange(self.lidar_points) * (fov / self.lidar_points)
+            sector_width = 2 * math.pi / len(SECTORS)
+            self.lidar_sectors = np.round(angles / sector_width).astype(np.intp) % len(SECTORS)
+
+        if depth_camera is not None:
+            self.depth_width = depth_camera.getWidth()
+            self.depth_height = depth_camera.getHeight()
+            self.depth_max = depth_camera.getMaxRange()
+            top, bottom = (int(self.depth_height * f) for f in DEPTH_BAND)
+            self.depth_rows = slice(top, max(bottom, top + 1))
+            self.depth_edges = np.linspace(0, self.depth_width, len(DEPTH_COLUMNS) + 1).astype(np.intp)
+
+    def lidar_distances(self):
+        ranges = clean_ranges(range_array(self.lidar, self.lidar_points), self.lidar_max)
+        nearest = np.full(len(SECTORS), self.lidar_max, dtype=np.float32)
+        np.minimum.at(nearest, self.lidar_sectors, ranges)
+        return nearest
+
+    def depth_distances(self):
+        image = range_array(self.depth_camera, self.depth_width * self.depth_height)
+        band = image.reshape(self.depth_height, self.depth_width)[self.depth_rows]
+        nearest = clean_ranges(band, self.depth_max).min(axis=0)
+        return np.minimum.reduceat(nearest, self.depth_edges[:-1])
+
+    def update(self, sim_time=None):
+        summary = {"time": sim_time}
+        if self.lidar is not None:
+            summary["lidar"] = dict(zip(SECTORS, np.round(self.lidar_distances().astype(float), 2).tolist()))
+        if self.depth_camera is not None:
+            summary["depth"] = dict(zip(DEPTH_COLUMNS, np.round(self.depth_distances().astype(float), 2).tolist()))
+        if self.range_sensors:
+            values = [sensor.getValue() for sensor in self.range_sensors]
+            summary["range"] = {name: round(v, 2) for name, v in zip(RANGE_SENSORS, values)
+                                if math.isfinite(v)}
+        self.summary = summary
+        return summary
+
+
+def describe_obstacles(summary):
+    # A few lines of text for the model prompt.
+    if not summary:
+        return ""
+    lines = []
+    lidar = summary.get("lidar")
+    if lidar:
+        lines.append("Nearest obstacle by direction (lidar, meters): "
+                     + ", ".join(f"{name} {distance:.1f}" for name, distance in lidar.items()) + ".")
+    depth = summary.get("depth")
+    if depth:
+        lines.append("Depth camera, nearest in view (meters): "
+                     + ", ".join(f"{name} {distance:.1f}" for name, distance in depth.items()) + ".")
+    readings = dict(lidar or {})
+    readings.update({f"{name} (range sensor)": d for name, d in (summary.get("range") or {}).items()})
+    if readings:
+        name, distance = min(readings.items(), key=lambda item: item[1])
+        lines.append(f"Closest obstacle: {distance:.1f} m {name}. Do not drive further than the free space.")
+    return "\n".join(lines)
@@ -0,0 +1,300 @@
+# recording.py
+# Session recordings: one append-only file per process holding the frames
+# sent to the model, the prompts, the model outputs and the command timings,
+# so that a session can be inspected and replayed later (see replay.py).
+#
+# The file is a header followed by chunks. Every chunk carries its kind, a
+# wall-clock timestamp, a JSON metadata part and an optional binary part,
+# with a CRC so a chunk cut short by a crash is detected and ignored. On a
+# clean close the recorder appends an index of frame offsets by sequence
+# number and a footer pointing at it; without the footer readers rebuild the
+# index by scanning the chunk headers.
+import argparse
+import atexit
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+MAGIC = b"VREC"
+INDEX_MAGIC = b"VIDX"
+VERSION = 1
+
+# magic, version
+FILE_HEADER = struct.Struct("<4sHxx")
+# kind, flags, timestamp, metadata length, data length, CRC-32 of metadata and data
+CHUNK_HEADER = struct.Struct("<BBxxdIII")
+# offset of the index chunk, magic
+FOOTER = struct.Struct("<Q4s")
+
+KIND_CODES = {
+    "session": 1,
+    "frame": 2,
+    "prompt": 3,
+    "output": 4,
+    "batch": 5,
+    "command": 6,
+    "index": 7,
+}
+KIND_NAMES = {code: name for name, code in KIND_CODES.items()}
+
+FLAG_ZLIB = 1
+
+# Encoded images that would not shrink any further.
+COMPRESSED_SIGNATURES = (b"\xff\xd8\xff", b"\x89PNG")
+
+Chunk = namedtuple("Chunk", ["kind", "timestamp", "meta", "data", "offset"])
+
+
+class RecordingError(Exception):
+    pass
+
+
+class SessionRecorder:
+    # Thread-safe; the server records from its request threads. A recorder
+    # without a path records nothing.
+    def __init__(self, process, path=None):
+        self.process = process
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+        self.frames = {}
+        self.frame_seq = 0
+        self.last_digest = None
+        self.chunks = 0
+
+        if path:
+            self.file = open(path, "wb")
+            self.file.write(FILE_HEADER.pack(MAGIC, VERSION))
+            self._write("session", {"process": process, "pid": os.getpid(), "started": time.time()})
+            atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls, process):
+        # VLA_RECORD_DIR enables recording; every process writes its own file.
+        directory = os.environ.get("VLA_RECORD_DIR")
+        if not directory:
+            return cls(process)
+        os.makedirs(directory, exist_ok=True)
+        name = f"{process}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.vlarec"
+        return cls(process, os.path.join(directory, name))
+
+    @property
+    def enabled(self):
+        return self.file is not None
+
+    def _write(self, kind, meta, data=b"", flags=0, timestamp=None):
+        # Callers hold the lock, except during __init__.
+        meta_bytes = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+        crc = zlib.crc32(data, zlib.crc32(meta_bytes))
+        header = CHUNK_HEADER.pack(KIND_CODES[kind], flags, timestamp or time.time(),
+                                   len(meta_bytes), len(data), crc)
+        offset = self.file.tell()
+        self.file.write(header + meta_bytes)
+        self.file.write(data)
+        # Flushed per chunk so a crash loses at most the chunk being written.
+        self.file.flush()
+        self.chunks += 1
+        return offset
+
+    def frame(self, data, **meta):
+        # Stores an encoded image once and returns its sequence number in
+        # this recording. A frame identical to the previous one, e.g. the
+        # same ring frame used for several prompts, is not stored again.
+        if not self.enabled:
+            return None
+        data = bytes(data)
+        digest = hashlib.sha1(data).digest()
+        flags = 0
+        if not data.startswith(COMPRESSED_SIGNATURES):
+            compressed = zlib.compress(data, 6)
+            if len(compressed) < len(data):
+                data, flags = compressed, FLAG_ZLIB
+
+        with self.lock:
+            if self.file is None:
+                return None
+            if digest == self.last_digest:
+                return self.frame_seq
+            self.frame_seq += 1
+            self.last_digest = digest
+            self.frames[self.frame_seq] = self._write("frame", dict(meta, seq=self.frame_seq), data, flags)
+            return self.frame_seq
+
+    def event(self, kind, **meta):
+        # prompt, output, batch or command; meta must be JSON serializable.
+        if not self.enabled:
+            return
+        with self.lock:
+            if self.file is not None:
+                self._write(kind, meta)
+
+    def close(self):
+        with self.lock:
+            if self.file is None:
+                return
+            offset = self._write("index", {"frames": {str(seq): pos for seq, pos in self.frames.items()}})
+            self.file.write(FOOTER.pack(offset, INDEX_MAGIC))
+            self.file.close()
+            self.file = None
+
+
+class SessionReader:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        magic, version = FILE_HEADER.unpack(self.file.read(FILE_HEADER.size))
+        if magic != MAGIC:
+            raise RecordingError(f"{path} is not a session recording")
+        if version != VERSION:
+            raise RecordingError(f"{path} has unsupported version {version}")
+        self.complete = False
+        self.frames = self._load_index()
+
+    def _load_index(self):
+        size = os.fstat(self.file.fileno()).st_size
+        if size >= FILE_HEADER.size + FOOTER.size:
+            self.file.seek(size - FOOTER.size)
+            offset, magic = FOOTER.unpack(self.file.read(FOOTER.size))
+            if magic == INDEX_MAGIC:
+                chunk = self._read_chunk(offset)
+                if chunk is not None and chunk.kind == "index":
+                    self.complete = True
+                    return {int(seq): pos for seq, pos in chunk.meta["frames"].items()}
+
+        # Not closed cleanly; find the frames from the chunk headers.
+        return {chunk.meta["seq"]: chunk.offset for chunk in self.chunks({"frame"}, with_data=False)}
+
+    def _read_chunk(self, offset, with_data=True):
+        # Returns None at the end of the file or at a damaged chunk.
+        self.file.seek(offset)
+        header = self.file.read(CHUNK_HEADER.size)
+        if len(header) < CHUNK_HEADER.size:
+            return None
+        code, flags, timestamp, meta_len, data_len, crc = CHUNK_HEADER.unpack(header)
+        if code not in KIND_NAMES:
+            return None
+        meta_bytes = self.file.read(meta_len)
+        data = self.file.read(data_len) if with_data else b""
+        if len(meta_bytes) < meta_len or (with_data and len(data) < data_len):
+            return None
+        if with_data and zlib.crc32(data, zlib.crc32(meta_bytes)) != crc:
+            return None
+        try:
+            meta = json.loads(meta_bytes)
+        except ValueError:
+            return None
+        if flags & FLAG_ZLIB and with_data:
+            data = zlib.decompress(data)
+        return Chunk(KIND_NAMES[code], timestamp, meta, data, offset)
+
+    def chunks(self, kinds=None, with_data=True):
+        # Yields chunks in the order they were written, reading the binary
+        # part only for the requested kinds.
+        size = os.fstat(self.file.fileno()).st_size
+        offset = FILE_HEADER.size
+        while True:
+            self.file.seek(offset)
+            header = self.file.read(CHUNK_HEADER.size)
+            if len(header) < CHUNK_HEADER.size:
+                return
+            code, _, _, meta_len, data_len, _ = CHUNK_HEADER.unpack(header)
+            kind = KIND_NAMES.get(code)
+            # The index is always last; a chunk running past the end of the
+            # file was cut short by a crash.
+            if kind is None or kind == "index" or offset + CHUNK_HEADER.size + meta_len + data_len > size:
+                return
+            if kinds is None or kind in kinds:
+                chunk = self._read_chunk(offset, with_data)
+                if chunk is None:
+                    return
+                yield chunk
+            offset += CHUNK_HEADER.size + meta_len + data_len
+
+    def frame(self, seq):
+        offset = self.frames.get(seq)
+        if offset is None:
+            raise KeyError(f"No frame {seq} in {self.path}")
+        chunk = self._read_chunk(offset)
+        if chunk is None:
+            raise RecordingError(f"Frame {seq} in {self.path} is damaged")
+        return chunk
+
+    def summary(self):
+        counts = {}
+        first = last = None
+        session = None
+        frame_bytes = 0
+        for chunk in self.chunks(with_data=False):
+            counts[chunk.kind] = counts.get(chunk.kind, 0) + 1
+            if chunk.kind == "session" and session is None:
+                session = chunk.meta
+            if first is None:
+                first = chunk.timestamp
+            last = chunk.timestamp
+        for seq in self.frames:
+            self.file.seek(self.frames[seq])
+            frame_bytes += CHUNK_HEADER.unpack(self.file.read(CHUNK_HEADER.size))[4]
+        return {
+            "path": self.path,
+            "session": session,
+            "complete": self.complete,
+            "seconds": round(last - first, 3) if first is not None else 0.0,
+            "chunks": counts,
+            "frames": len(self.frames),
+            "frame_bytes": frame_bytes,
+        }
+
+    def close(self):
+        self.file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect ROSbot VLA session recordings")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    info = subparsers.add_parser("info", help="Summarize recordings")
+    info.add_argument("paths", nargs="+")
+
+    dump = subparsers.add_parser("dump", help="Print every chunk's metadata as JSON lines")
+    dump.add_argument("path")
+    dump.add_argument("--kind", action="append", choices=sorted(KIND_CODES), help="Only these kinds")
+
+    frames = subparsers.add_parser("frames", help="Write the recorded frames to a directory")
+    frames.add_argument("path")
+    frames.add_argument("--output", required=True)
+
+    args = parser.parse_args()
+
+    if args.command == "info":
+        for path in args.paths:
+            reader = SessionReader(path)
+            print(json.dumps(reader.summary(), indent=2))
+            reader.close()
+        return
+
+    reader = SessionReader(args.path)
+    try:
+        if args.command == "dump":
+            kinds = set(args.kind) if args.kind else None
+            for chunk in reader.chunks(kinds, with_data=False):
+                print(json.dumps({"kind": chunk.kind, "time": chunk.timestamp, **chunk.meta}))
+        else:
+            os.makedirs(args.output, exist_ok=True)
+            for seq in sorted(reader.frames):
+                chunk = reader.frame(seq)
+                ext = ".jpg" if chunk.data.startswith(b"\xff\xd8\xff") else \
+                      ".png" if chunk.data.startswith(b"\x89PNG") else ".bin"
+                with open(os.path.join(args.output, f"frame_{seq:08d}{ext}"), "wb") as f:
+                    f.write(chunk.data)
+            print(f"Wrote {len(reader.frames)} frames to {args.output}")
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+# replay.py
+# Feeds a session recording (see recording.py) back through the VLA server
+# or the controller, for throughput and latency benchmarks on real traffic.
+# Requests go out at their recorded offsets (--speed original) or as fast
+# as the target takes them (--speed max). Prints JSON like benchmark.py.
+import argparse
+import base64
+import contextlib
+import io
+import json
+import logging
+import math
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmark import summarize, environment
+from recording import SessionReader
+
+
+def paced(chunks, speed, items=None):
+    # Yields each chunk, or the matching item, when it is due relative to
+    # the first chunk.
+    if not chunks:
+        return
+    first = chunks[0].timestamp
+    start = time.perf_counter()
+    for i, chunk in enumerate(chunks):
+        if speed == "original":
+            delay = start + (chunk.timestamp - first) - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        yield chunk if items is None else items[i]
+
+
+def replay_server(args, reader):
+    prompts = list(reader.chunks({"prompt"}, with_data=False))
+    outputs = {c.meta["trace_id"]: c for c in reader.chunks({"output"}, with_data=False)}
+    recorded = [outputs[p.meta["trace_id"]].timestamp - p.timestamp
+                for p in prompts if p.meta["trace_id"] in outputs]
+
+    httpd = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        # Same in-process setup as `benchmark.py server`; main builds its
+        # backend at import time.
+        os.environ.setdefault("VLA_BACKEND", "stub")
+        from werkzeug.serving import make_server
+        import main as vla_server
+
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        httpd = make_server("127.0.0.1", 0, vla_server.app, threaded=True)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{httpd.server_port}"
+
+    images = {}
+
+    def request_body(prompt):
+        meta = prompt.meta
+        if meta["frame"] not in images:
+            images[meta["frame"]] = base64.b64encode(reader.frame(meta["frame"]).data).decode("ascii")
+        body = {
+            "image_base64": images[meta["frame"]],
+            "user_prompt": meta.get("user_prompt", ""),
+            "robot_id": meta.get("robot_id"),
+            "priority": meta.get("priority", 0),
+            "dispatch": args.dispatch,
+        }
+        if args.model or meta.get("model"):
+            body["model"] = args.model or meta["model"]
+        if meta.get("context"):
+            body["obstacles"] = meta["context"]
+        return body
+
+    def one_request(prompt, body):
+        # Jobs are replayed synchronously; polling would only add noise.
+        stream = prompt.meta.get("endpoint") == "/process-image/stream"
+        url = base_url + ("/process-image/stream" if stream else "/process-image")
+        req = urllib.request.Request(url, data=json.dumps(body).encode(),
+                                     headers={"Content-Type": "application/json"})
+        start = time.perf_counter()
+        first_command = None
+        raw = None
+        try:
+            with urllib.request.urlopen(req, timeout=args.timeout) as response:
+                status = response.status
+                if stream:
+                    for line in response:
+                        event = json.loads(line)
+                        if first_command is None and event.get("type") == "command":
+                            first_command = time.perf_counter() - start
+                        if event.get("type") == "done":
+                            raw = event.get("raw")
+                else:
+                    raw = json.loads(response.read()).get("raw")
+        except urllib.error.HTTPError as e:
+            status = e.code
+            try:
+                raw = json.loads(e.read()).get("raw")
+            except ValueError:
+                pass
+        except OSError:
+            status = "error"
+        return prompt, status, time.perf_counter() - start, first_command, raw
+
+    # Bodies are built up front so reading the recording does not delay
+    # the requests.
+    work = [(prompt, request_body(prompt)) for prompt in prompts]
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [pool.submit(one_request, prompt, body)
+                       for prompt, body in paced(prompts, args.speed, work)]
+            outcomes = [f.result() for f in futures]
+    finally:
+        elapsed = time.perf_counter() - start
+        if httpd is not None:
+            httpd.shutdown()
+
+    statuses = {}
+    same = different = 0
+    for prompt, status, _, _, raw in outcomes:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        output = outputs.get(prompt.meta["trace_id"])
+        if output is not None and raw is not None:
+            if raw == output.meta.get("raw"):
+                same += 1
+            else:
+                different += 1
+
+    results = {
+        "target": args.url or "in-process",
+        "speed": args.speed,
+        "requests": len(outcomes),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(outcomes) / elapsed, 2) if elapsed else None,
+        "statuses": statuses,
+        "latency": summarize([t for _, status, t, _, _ in outcomes if status == 200]),
+        "recorded_latency": summarize(recorded),
+        # Whether the model still answers every recorded request the same way.
+        "outputs": {"same": same, "different": different},
+    }
+    first_commands = [f for _, _, _, f, _ in outcomes if f is not None]
+    if first_commands:
+        results["first_command"] = summarize(first_commands)
+    return results
+
+
+def replay_controller(args, reader):
+    batches = list(reader.chunks({"batch"}, with_data=False))
+    recorded = [c.meta["end"] - c.meta["start"] for c in reader.chunks({"command"}, with_data=False)]
+
+    controller = None
+    if args.address:
+        host, _, port = args.address.rpartition(":")
+        address = (host or "127.0.0.1", int(port))
+    else:
+        # Keep away from a controller that may be running on this machine.
+        os.environ.setdefault("ROSBOT_COMMAND_PORT", "0")
+        os.environ.setdefault("ROSBOT_FRAME_RING", f"rosbot_replay_{os.getpid()}")
+        import fake_robot
+
+        fake_robot.install()
+        if args.speed == "original":
+            first = []
+
+            def clock(robot):
+                # Real-time pacing, as in `benchmark.py controller`.
+                now = time.perf_counter()
+                if not first:
+                    first.append(now)
+                target = first[0] + robot.steps * period
+                if target > now:
+                    time.sleep(target - now)
+
+            fake_robot.Robot.clock = staticmethod(clock)
+
+        import rosbot
+        period = rosbot.TIME_STEP / 1000.0
+        log = io.StringIO()
+        with contextlib.redirect_stdout(log):
+            controller = rosbot.ROSbotController()
+        address = controller.command_server.address
+
+    from command_channel import CommandClient, ChannelError
+
+    def idle():
+        return not controller.is_executing_commands and not controller.motion.active
+
+    acks = []
+    errors = []
+    done = threading.Event()
+
+    def send_batches():
+        client = CommandClient(*address)
+        try:
+            for batch in paced(batches, args.speed):
+                meta = batch.meta
+                mode = meta.get("mode", "replace")
+                if controller is not None and args.speed == "max" and mode == "replace":
+                    # Back to back would preempt every batch; let the
+                    # previous one finish so the motions actually run.
+                    while not idle() and not done.is_set():
+                        time.sleep(0.001)
+                start = time.perf_counter()
+                try:
+                    client.send(meta["commands"], mode=mode, trace_id=meta.get("trace_id"))
+                    acks.append(time.perf_counter() - start)
+                except ChannelError as e:
+                    errors.append(str(e))
+            if controller is not None:
+                time.sleep(2 * period)
+                while not idle() and not done.is_set():
+                    time.sleep(0.001)
+        finally:
+            client.close()
+            if controller is not None:
+                controller.robot.max_steps = controller.robot.steps
+
+    start = time.perf_counter()
+    sender = threading.Thread(target=send_batches, daemon=True)
+    sender.start()
+    if controller is not None:
+        with contextlib.redirect_stdout(log):
+            try:
+                controller.run()
+            finally:
+                done.set()
+    sender.join()
+    elapsed = time.perf_counter() - start
+
+    results = {
+        "target": args.address or "simulated",
+        "speed": args.speed,
+        "batches": len(batches),
+        "sent": len(acks),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "ack": summarize(acks),
+        "recorded": {
+            "seconds": round(batches[-1].timestamp - batches[0].timestamp, 3) if batches else 0.0,
+            "command_duration": summarize(recorded),
+        },
+    }
+    if controller is not None:
+        sim_seconds = controller.robot.getTime()
+        x, y, theta = controller.robot.pose
+        results.update({
+            "sim_seconds": round(sim_seconds, 3),
+            "realtime_factor": round(sim_seconds / elapsed, 2) if elapsed else None,
+            "controller": controller.counters.snapshot(),
+            "final_pose": [round(x, 3), round(y, 3), round(math.degrees(theta), 1)],
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a ROSbot VLA session recording")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    subparsers = parser.add_subparsers(dest="target", required=True)
+
+    server = subparsers.add_parser("server", help="Send the recorded prompts and frames to the VLA server")
+    server.add_argument("recording")
+    server.add_argument("--url", help="Running server, e.g. http://localhost:5000; "
+                                      "default is an in-process server using VLA_BACKEND (stub if unset)")
+    server.add_argument("--speed", choices=("original", "max"), default="original")
+    server.add_argument("--concurrency", type=int, default=16)
+    server.add_argument("--model", help="Override the recorded model")
+    server.add_argument("--dispatch", action="store_true", help="Forward the commands to the controller")
+    server.add_argument("--timeout", type=float, default=120.0)
+    server.set_defaults(func=replay_server)
+
+    controller = subparsers.add_parser("controller", help="Send the recorded command batches to the controller")
+    controller.add_argument("recording")
+    controller.add_argument("--address", help="Command channel of a running controller, e.g. 127.0.0.1:5005; "
+                                              "default is a controller on the simulated robot")
+    controller.add_argument("--speed", choices=("original", "max"), default="original")
+    controller.set_defaults(func=replay_controller)
+
+    args = parser.parse_args()
+    reader = SessionReader(args.recording)
+    try:
+        results = {"environment": environment(), "recording": reader.summary()}
+        results["replay"] = args.func(args, reader)
+    finally:
+        reader.close()
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,34 @@ import sys
 import time
 import tempfile
 import json
+import math
 from controller import Robot
 
+from frame_encoder import encode_frame, HAS_PIL
+from frame_ring import FrameRing, ring_name, slot_size_for
+from frame_store import FrameStore, write_atomic
+from capture_scheduler import CaptureScheduler
+from command_channel import CommandServer, DEFAULT_HOST, DEFAULT_PORT
+from frame_notify import FrameNotifier
+from motion import Drive, Turn, MotionExecutor, Odometry
+from commands import load_commands
+from tracing import Tracer, new_trace_id
+from metrics import ControllerCounters
+from perception import Perception
+from recording import SessionRecorder
+
 TIME_STEP = 32
 MAX_VELOCITY = 26.0
 BASE_SPEED = 6.0
+CAPTURE_FPS = float(os.environ.get("ROSBOT_CAPTURE_FPS", 10))
+CAPTURE_WORKERS = int(os.environ.get("ROSBOT_CAPTURE_WORKERS", 2))
+FRAME_RETENTION = int(os.environ.get("ROSBOT_FRAME_RETENTION", 100))
+FRAME_MAX_BYTES = int(os.environ.get("ROSBOT_FRAME_MAX_BYTES", 64 * 1024 * 1024))
+FRAME_MAX_AGE = float(os.environ.get("ROSBOT_FRAME_MAX_AGE", 600))
+METRICS_FILE = os.environ.get("ROSBOT_METRICS_FILE")
+METRICS_INTERVAL = float(os.environ.get("ROSBOT_METRICS_INTERVAL", 10))
+PERCEPTION_EVERY = int(os.environ.get("ROSBOT_PERCEPTION_EVERY", 1))
+STANDBY_MAX_AGE = float(os.environ.get("ROSBOT_STANDBY_MAX_AGE", 10))
 
 class ROSbotController:
     def __init__(self):
@@ -60,17 +83,65 @@ class ROSbotController:
         for sensor in self.distance_sensors:
             sensor.enable(TIME_STEP)
         
+        self.perception = None
+        if PERCEPTION_EVERY > 0:
+            try:
+                self.perception = Perception(self.lidar, self.camera_depth, self.distance_sensors)
+            except Exception as e:
+                print(f"Obstacle summary unavailable: {e}")
+        self.step_count = 0
+        
         self.speed = BASE_SPEED
         self.is_executing_commands = False
         self.command_queue = []
+        self.motion = MotionExecutor(self.set_motor_speeds, self.stop)
+        
+        # Plan sent ahead in continuous mode: (commands, trace id, received),
+        # started as soon as the queue drains.
+        self.standby = None
+        self.standby_used = None
+        
+        # Trace of the batch being executed: the id the frame was captured
+        # with, when the batch arrived and which command is running.
+        self.tracer = Tracer.from_env("controller")
+        self.recorder = SessionRecorder.from_env("controller")
+        self.trace_id = None
+        self.batch_received = None
+        self.current_command = None
+        
+        self.counters = ControllerCounters(TIME_STEP / 1000.0)
+        self.step_started = None
+        self.next_metrics_dump = METRICS_INTERVAL
         
         self.image_dir = tempfile.gettempdir()
+        self.image_format = "JPEG"
+        self.image_quality = 85
+        if not HAS_PIL:
+            print("Pillow is not installed, frames will be published as BMP")
+        
+        self.frame_store = None
+        try:
+            self.frame_ring = FrameRing.create(
+                ring_name(), slot_size=slot_size_for(self.camera_rgb.getWidth(), self.camera_rgb.getHeight()))
+        except Exception as e:
+            print(f"Shared memory frame ring unavailable, saving frames to disk: {e}")
+            self.frame_ring = None
+            self.frame_store = FrameStore(
+                self.image_dir, max_frames=FRAME_RETENTION,
+                max_bytes=FRAME_MAX_BYTES, max_age=FRAME_MAX_AGE)
+        
+        self.frame_notifier = FrameNotifier()
         
-        self.command_file = os.path.join(self.image_dir, "rosbot_commands.json")
-        self.last_command_check = 0
+        self.capture_scheduler = CaptureScheduler(
+            self.grab_frame, self.encode_frame, self.store_frame,
+            target_fps=CAPTURE_FPS, max_workers=CAPTURE_WORKERS)
+        
+        self.command_server = CommandServer(DEFAULT_HOST, DEFAULT_PORT, status=self.command_status)
         
         print(f"ROSbot initialized. Image directory: {self.image_dir}")
-        print(f"Command file: {self.command_file}")
+        if self.frame_ring:
+            print(f"Frame ring: {self.frame_ring.name} ({self.frame_ring.slots} slots)")
+        print(f"Command channel: {self.command_server.address[0]}:{self.command_server.address[1]}")
         
     def set_motor_speeds(self, left_speed, right_speed):
         left_speed = min(max(left_speed, -MAX_VELOCITY), MAX_VELOCITY)
@@ -84,188 +155,227 @@ class ROSbotController:
     def stop(self):
         self.set_motor_speeds(0, 0)
     
-    def capture_image(self):
-        image = self.camera_rgb.getImage()
-        width = self.camera_rgb.getWidth()
-        height = self.camera_rgb.getHeight()
-        
-        image_path = os.path.join(self.image_dir, f"rosbot_image_{int(time.time())}.jpg")
-        
-        with open(f"{image_path}.bmp", "wb") as f:
-            f.write(bytes([ord('B'), ord('M')]))
-            size = 54 + 3 * width * height
-            f.write(size.to_bytes(4, byteorder='little'))
-            f.write(bytes([0, 0, 0, 0]))
-            f.write((54).to_bytes(4, byteorder='little'))
-            f.write((40).to_bytes(4, byteorder='little'))
-            f.write(width.to_bytes(4, byteorder='little'))
-            f.write(height.to_bytes(4, byteorder='little'))
-            f.write((1).to_bytes(2, byteorder='little'))
-            f.write((24).to_bytes(2, byteorder='little'))
-            f.write(bytes([0, 0, 0, 0]))
-            f.write(bytes([0, 0, 0, 0]))
-            f.write(bytes([0, 0, 0, 0]))
-            f.write(bytes([0, 0, 0, 0]))
-            f.write(bytes([0, 0, 0, 0]))
-            f.write(bytes([0, 0, 0, 0]))
+    def step(self):
+        # Time between robot.step calls is our own work for the step; past
+        # TIME_STEP it slows the simulation down.
+        if self.step_started is not None:
+            self.counters.step(time.perf_counter() - self.step_started)
+        if self.robot.step(TIME_STEP) == -1:
+            return False
+        self.step_started = time.perf_counter()
+        
+        now = self.robot.getTime()
+        self.step_count += 1
+        if self.perception and self.step_count % PERCEPTION_EVERY == 0:
+            try:
+                self.perception.update(now)
+            except Exception as e:
+                print(f"Error reading range sensors: {e}")
+                self.perception = None
+        self.capture_scheduler.tick(now)
+        self.check_for_commands()
+        if METRICS_INTERVAL > 0 and now >= self.next_metrics_dump:
+            self.next_metrics_dump = now + METRICS_INTERVAL
+            self.dump_metrics()
+        return True
+    
+    def dump_metrics(self):
+        capture = self.capture_scheduler.stats()
+        if METRICS_FILE:
+            try:
+                write_atomic(METRICS_FILE, self.counters.render(capture).encode("utf-8"))
+            except OSError as e:
+                print(f"Error writing metrics: {e}")
+        else:
+            print(f"Controller metrics: {json.dumps(self.counters.snapshot())}")
+    
+    def grab_frame(self):
+        # Every frame gets a trace id that follows it to the VLA server and
+        # back with the commands planned from it, and the obstacle summary
+        # from the same step.
+        meta = {"trace_id": new_trace_id()}
+        if self.perception and self.perception.summary:
+            meta["obstacles"] = self.perception.summary
+        with self.tracer.span("capture.grab", meta["trace_id"]):
+            image = self.camera_rgb.getImage()
+            width = self.camera_rgb.getWidth()
+            height = self.camera_rgb.getHeight()
+        return image, width, height, meta
+    
+    def encode_frame(self, image, width, height, meta=None):
+        trace_id = meta.get("trace_id") if meta else None
+        with self.tracer.span("capture.encode", trace_id, format=self.image_format):
+            data, fmt = encode_frame(image, width, height, self.image_format, self.image_quality)
+        return data, width, height, fmt, meta
+    
+    def store_frame(self, encoded):
+        data, width, height, fmt, meta = encoded
+        trace_id = meta.get("trace_id") if meta else None
+        
+        with self.tracer.span("capture.store", trace_id, bytes=len(data)):
+            if self.frame_ring:
+                seq = self.frame_ring.write(data, width, height, fmt, meta=meta)
+                self.frame_notifier.notify(seq, ring=self.frame_ring.name)
+                return f"{self.frame_ring.name}#{seq}"
             
-            for y in range(height - 1, -1, -1):
-                for x in range(width):
-                    idx = (y * width + x) * 4
-                    b = int(image[idx + 2])
-                    g = int(image[idx + 1])
-                    r = int(image[idx])
-                    f.write(bytes([b, g, r]))
-                
-                padding_len = (4 - (width * 3) % 4) % 4
-                f.write(bytes([0] * padding_len))
-        
-        try:
-            from PIL import Image
-            img = Image.open(f"{image_path}.bmp")
-            img.save(image_path)
-            os.remove(f"{image_path}.bmp")
-        except ImportError:
-            image_path = f"{image_path}.bmp"
-        
-        return image_path
+            seq, image_path = self.frame_store.save(data, width, height, fmt, meta=meta)
+            self.frame_notifier.notify(seq, path=image_path)
+            return image_path
     
-    def execute_commands(self, commands_str):
-        if commands_str.startswith("[") and commands_str.endswith("]"):
-            commands = commands_str.strip("[]").split(",")
-            commands = [cmd.strip().strip('"\'') for cmd in commands if cmd.strip()]
+    def capture_image(self):
+        return self.store_frame(self.encode_frame(*self.grab_frame()))
+    
+    def execute_commands(self, commands_data, mode="replace", trace_id=None):
+        commands, errors = load_commands(commands_data)
+        for error in errors:
+            print(f"Invalid command {error.text}: {error.message}")
+        self.counters.batch(len(commands), len(errors))
+        
+        if mode == "standby":
+            # An empty standby batch withdraws the plan.
+            self.standby = (commands, trace_id, time.time()) if commands else None
+            return
+        
+        if mode == "append":
+            self.command_queue.extend(commands)
         else:
-            commands = commands_str.strip().split("\n")
-            commands = [cmd.strip().strip('"\'') for cmd in commands if cmd.strip()]
-        
-        self.command_queue = commands
+            self.motion.cancel()
+            self.finish_command()
+            self.command_queue = commands
+            self.batch_received = time.time()
+            # Planned for the end of the batch just replaced.
+            self.standby = None
+        self.trace_id = trace_id
+        self.counters.queue(len(self.command_queue))
         self.is_executing_commands = True
-        print(f"Added commands to queue: {commands}")
+        print(f"Added commands to queue: {[str(c) for c in commands]}")
     
     def process_command(self, command):
         print(f"Executing command: {command}")
         
-        if command.startswith("go_ahead"):
-            try:
-                distance = float(command.split("(")[1].split(")")[0])
-                self.move_forward(distance)
-                return True
-            except:
-                print(f"Invalid go_ahead command: {command}")
-                
-        elif command.startswith("go_back"):
-            try:
-                distance = float(command.split("(")[1].split(")")[0])
-                self.move_backward(distance)
-                return True
-            except:
-                print(f"Invalid go_back command: {command}")
-                
-        elif command.startswith("turn_left"):
-            try:
-                angle = float(command.split("(")[1].split(")")[0])
-                self.turn_left(angle)
-                return True
-            except:
-                print(f"Invalid turn_left command: {command}")
-                
-        elif command.startswith("turn_right"):
-            try:
-                angle = float(command.split("(")[1].split(")")[0])
-                self.turn_right(angle)
-                return True
-            except:
-                print(f"Invalid turn_right command: {command}")
-                
-        elif command.startswith("change_speed"):
-            try:
-                speed = float(command.split("(")[1].split(")")[0])
-                self.change_speed(speed)
-                return False
-            except:
-                print(f"Invalid change_speed command: {command}")
+        now = time.time()
+        if self.batch_received is not None:
+            self.tracer.record("controller.queue_wait", self.trace_id, self.batch_received, now)
+            self.batch_received = None
+        self.current_command = (str(command), now)
+        self.counters.executed()
+        self.counters.queue(len(self.command_queue))
+        
+        if command.name == "go_ahead":
+            self.move_forward(command.value)
+            return True
+        elif command.name == "go_back":
+            self.move_backward(command.value)
+            return True
+        elif command.name == "turn_left":
+            self.turn_left(command.value)
+            return True
+        elif command.name == "turn_right":
+            self.turn_right(command.value)
+            return True
+        elif command.name == "change_speed":
+            self.change_speed(command.value)
         
         return False
     
-    def move_forward(self, distance):
-        duration = distance / (self.speed * 0.01)
-        
-        self.set_motor_speeds(self.speed, self.speed)
-        start_time = self.robot.getTime()
+    def start_standby(self):
+        commands, trace_id, received = self.standby
+        self.standby = None
+        if time.time() - received > STANDBY_MAX_AGE:
+            print(f"Discarding standby plan received {time.time() - received:.1f} s ago")
+            return
+        
+        self.tracer.record("controller.standby", trace_id, received)
+        self.command_queue = commands
+        self.trace_id = trace_id
+        self.batch_received = time.time()
+        self.standby_used = trace_id
+        self.counters.queue(len(self.command_queue))
+        self.is_executing_commands = True
+        print(f"Starting standby plan: {[str(c) for c in commands]}")
+    
+    def command_status(self):
+        # Returned with every command channel ack.
+        return {
+            "busy": self.motion.active or bool(self.command_queue),
+            "queue": len(self.command_queue),
+            "standby": self.standby[1] if self.standby else None,
+            "standby_used": self.standby_used,
+        }
+    
+    def finish_command(self):
+        if self.current_command is not None:
+            name, start = self.current_command
+            self.tracer.record("controller.command", self.trace_id, start, command=name)
+            self.recorder.event("command", trace_id=self.trace_id, command=name, start=start, end=time.time())
+            self.current_command = None
+    
+    def read_odometry(self):
+        left = (self.front_left_position_sensor.getValue() + self.rear_left_position_sensor.getValue()) / 2
+        right = (self.front_right_position_sensor.getValue() + self.rear_right_position_sensor.getValue()) / 2
         
-        while self.robot.step(TIME_STEP) != -1:
-            current_time = self.robot.getTime()
-            if current_time - start_time >= duration:
-                break
+        north = self.compass.getValues()
+        heading = None
+        if north and not any(math.isnan(v) for v in north):
+            heading = math.atan2(north[0], north[1])
         
-        self.stop()
+        return Odometry(left, right, heading, self.robot.getTime())
+    
+    def move_forward(self, distance):
+        self.motion.start(Drive(distance, self.speed), self.read_odometry())
     
     def move_backward(self, distance):
-        duration = distance / (self.speed * 0.01)
-        
-        self.set_motor_speeds(-self.speed, -self.speed)
-        start_time = self.robot.getTime()
-        
-        while self.robot.step(TIME_STEP) != -1:
-            current_time = self.robot.getTime()
-            if current_time - start_time >= duration:
-                break
-        
-        self.stop()
+        self.motion.start(Drive(-distance, self.speed), self.read_odometry())
     
     def turn_left(self, angle):
-        duration = (angle / 180) * 3.14
-        
-        self.set_motor_speeds(-self.speed, self.speed)
-        start_time = self.robot.getTime()
-        
-        while self.robot.step(TIME_STEP) != -1:
-            current_time = self.robot.getTime()
-            if current_time - start_time >= duration:
-                break
-        
-        self.stop()
+        self.motion.start(Turn(angle, self.speed), self.read_odometry())
     
     def turn_right(self, angle):
-        duration = (angle / 180) * 3.14
-        
-        self.set_motor_speeds(self.speed, -self.speed)
-        start_time = self.robot.getTime()
-        
-        while self.robot.step(TIME_STEP) != -1:
-            current_time = self.robot.getTime()
-            if current_time - start_time >= duration:
-                break
-        
-        self.stop()
+        self.motion.start(Turn(-angle, self.speed), self.read_odometry())
     
     def change_speed(self, speed_percent):
         self.speed = MAX_VELOCITY * (speed_percent / 100.0)
         print(f"Speed changed to {self.speed}")
     
     def check_for_commands(self):
-        if os.path.exists(self.command_file):
-            mod_time = os.path.getmtime(self.command_file)
-            if mod_time > self.last_command_check:
-                self.last_command_check = mod_time
-                try:
-                    with open(self.command_file, 'r') as f:
-                        data = json.load(f)
-                        if "commands" in data:
-                            self.execute_commands(data["commands"])
-                except Exception as e:
-                    print(f"Error reading command file: {e}")
+        for message in self.command_server.poll():
+            if "commands" in message:
+                trace_id = message.get("trace_id")
+                self.tracer.record("controller.pickup", trace_id, message.get("sent", time.time()))
+                self.recorder.event("batch", trace_id=trace_id, mode=message.get("mode", "replace"),
+                                    commands=message["commands"], sent=message.get("sent"))
+                self.execute_commands(message["commands"], message.get("mode", "replace"), trace_id)
     
     def run(self):
-        while self.robot.step(TIME_STEP) != -1:
-            image_path = self.capture_image()
-            print(f"Captured image: {image_path}")
+        try:
+            self.control_loop()
+        finally:
+            self.capture_scheduler.close()
+            self.command_server.close()
+            self.frame_notifier.close()
+            self.tracer.close()
+            self.recorder.close()
+            self.dump_metrics()
+            print(f"Capture stats: {self.capture_scheduler.stats()}")
+            if self.frame_ring:
+                self.frame_ring.close()
+    
+    def control_loop(self):
+        while self.step():
+            if self.motion.active:
+                self.motion.tick(self.read_odometry())
+                if not self.motion.active:
+                    self.finish_command()
+                continue
             
-            self.check_for_commands()
+            if not self.command_queue and self.standby is not None:
+                self.start_standby()
             
             if self.is_executing_commands and self.command_queue:
                 command = self.command_queue.pop(0)
                 requires_wait = self.process_command(command)
+                if not self.motion.active:
+                    self.finish_command()
                 
                 if requires_wait:
                     continue
@@ -0,0 +1,158 @@
+# scheduler.py
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from capture_scheduler import LatencyStat
+
+
+class SchedulerFull(Exception):
+    pass
+
+
+class ScheduledRequest:
+    __slots__ = ("robot_id", "model", "priority", "fn", "args", "future", "enqueued")
+
+    def __init__(self, robot_id, model, priority, fn, args):
+        self.robot_id = robot_id
+        self.model = model
+        self.priority = priority
+        self.fn = fn
+        self.args = args
+        self.future = Future()
+        self.enqueued = time.monotonic()
+
+
+class InferenceScheduler:
+    # Requests are queued per model and per robot. After the first request
+    # of a burst arrives the dispatcher waits `window` seconds so that
+    # concurrent requests from other robots are visible, then hands them to
+    # at most `max_sessions` concurrent model sessions per model: highest
+    # priority first, ties going to the robot served least recently.
+    def __init__(self, window=0.02, max_sessions=2, max_queue_per_robot=16):
+        self.window = window
+        self.max_sessions = max_sessions
+        self.max_queue_per_robot = max_queue_per_robot
+
+        self.cond = threading.Condition()
+        self.queues = {}
+        self.active = {}
+        self.last_served = {}
+        self.serve_order = itertools.count()
+        self.running = True
+
+        self.wait_time = {}
+        self.run_time = {}
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+        self.executor = ThreadPoolExecutor(thread_name_prefix="vla-session")
+        self.dispatcher = threading.Thread(target=self._dispatch_loop, name="vla-scheduler", daemon=True)
+        self.dispatcher.start()
+
+    def submit(self, fn, *args, robot_id="default", model="default", priority=0):
+        request = ScheduledRequest(robot_id, model, priority, fn, args)
+        with self.cond:
+            queue = self.queues.setdefault(model, {}).setdefault(robot_id, deque())
+            if len(queue) >= self.max_queue_per_robot:
+                self.rejected += 1
+                raise SchedulerFull(f"Robot {robot_id} already has {len(queue)} queued requests")
+            queue.append(request)
+            self.cond.notify_all()
+        return request.future
+
+    def run(self, fn, *args, robot_id="default", model="default", priority=0):
+        return self.submit(fn, *args, robot_id=robot_id, model=model, priority=priority).result()
+
+    def _dispatchable(self):
+        return [model for model, robots in self.queues.items()
+                if self.active.get(model, 0) < self.max_sessions and any(robots.values())]
+
+    def _dispatch_loop(self):
+        with self.cond:
+            while self.running:
+                models = self._dispatchable()
+                if not models:
+                    self.cond.wait()
+                    continue
+
+                oldest = min(q[0].enqueued for m in models for q in self.queues[m].values() if q)
+                remaining = self.window - (time.monotonic() - oldest)
+                if remaining > 0:
+                    self.cond.wait(remaining)
+                    continue
+
+                for model in models:
+                    while self.active.get(model, 0) < self.max_sessions:
+                        request = self._pick(model)
+                        if request is None:
+                            break
+                        self.active[model] = self.active.get(model, 0) + 1
+                        self.executor.submit(self._run, request)
+
+    def _pick(self, model):
+        best = None
+        best_key = None
+        for robot_id, queue in self.queues[model].items():
+            if not queue:
+                continue
+            key = (queue[0].priority, -self.last_served.get((model, robot_id), -1))
+            if best_key is None or key > best_key:
+                best, best_key = queue, key
+        if best is None:
+            return None
+        request = best.popleft()
+        self.last_served[(model, request.robot_id)] = next(self.serve_order)
+        return request
+
+    def _run(self, request):
+        started = time.monotonic()
+        if request.future.set_running_or_notify_cancel():
+            try:
+                request.future.set_result(request.fn(*request.args))
+                failed = False
+            except Exception as e:
+                request.future.set_exception(e)
+                failed = True
+        else:
+            failed = False
+
+        finished = time.monotonic()
+        with self.cond:
+            self.active[request.model] -= 1
+            self.wait_time.setdefault(request.model, LatencyStat()).add(started - request.enqueued)
+            self.run_time.setdefault(request.model, LatencyStat()).add(finished - started)
+            if failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+            self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            models = {}
+            for model, robots in self.queues.items():
+                models[model] = {
+                    "queue_depth": sum(len(q) for q in robots.values()),
+                    "queued_by_robot": {robot: len(q) for robot, q in robots.items() if q},
+                    "active_sessions": self.active.get(model, 0),
+                    "wait": self.wait_time.get(model, LatencyStat()).as_dict(),
+                    "run": self.run_time.get(model, LatencyStat()).as_dict(),
+                }
+            return {
+                "queue_depth": sum(m["queue_depth"] for m in models.values()),
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "models": models,
+            }
+
+    def close(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.dispatcher.join()
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,254 @@
+# tracing.py
+# Lightweight span recorder for following one frame from capture to motor
+# actuation across the controller, GUI and VLA server processes. Each
+# process writes its own file; `python tracing.py report <dir>` joins them
+# by trace id.
+import argparse
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+FORMATS = ("jsonl", "chrome")
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+class Tracer:
+    # Spans use wall-clock time so that spans from different processes on
+    # the same machine line up. Events are buffered and appended to the
+    # file in batches; a disabled tracer records nothing.
+    def __init__(self, process, path=None, fmt="jsonl", flush_every=64, flush_interval=1.0):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown trace format '{fmt}', expected one of {FORMATS}")
+        self.process = process
+        self.path = path
+        self.fmt = fmt
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.pid = os.getpid()
+
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.last_flush = time.monotonic()
+        self.started = False
+        if path:
+            atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls, process):
+        # VLA_TRACE_DIR enables tracing; every process writes its own file.
+        directory = os.environ.get("VLA_TRACE_DIR")
+        if not directory:
+            return cls(process)
+        fmt = os.environ.get("VLA_TRACE_FORMAT", "jsonl")
+        ext = ".trace.json" if fmt == "chrome" else ".trace.jsonl"
+        os.makedirs(directory, exist_ok=True)
+        return cls(process, os.path.join(directory, f"{process}-{os.getpid()}{ext}"), fmt)
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    @contextmanager
+    def span(self, name, trace_id=None, **attrs):
+        # Yields the attribute dict so the body can add results to it.
+        if not self.enabled:
+            yield attrs
+            return
+        start = time.time()
+        try:
+            yield attrs
+        finally:
+            self.record(name, trace_id, start, time.time(), **attrs)
+
+    def record(self, name, trace_id, start, end=None, **attrs):
+        # For spans whose start was taken elsewhere, e.g. a frame timestamp.
+        if not self.enabled:
+            return
+        if end is None:
+            end = time.time()
+        event = {
+            "trace_id": trace_id,
+            "name": name,
+            "process": self.process,
+            "pid": self.pid,
+            "tid": threading.get_native_id(),
+            "thread": threading.current_thread().name,
+            "start": start,
+            "duration_ms": round((end - start) * 1000, 3),
+        }
+        if attrs:
+            event["attrs"] = attrs
+
+        with self.lock:
+            self.buffer.append(event)
+            if len(self.buffer) >= self.flush_every or \
+               time.monotonic() - self.last_flush > self.flush_interval:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        self.last_flush = time.monotonic()
+        if not self.buffer or not self.path:
+            return
+        events, self.buffer = self.buffer, []
+        if self.fmt == "chrome":
+            lines = [] if self.started else ["[", json.dumps(self._process_name_event()) + ","]
+            lines.extend(json.dumps(chrome_event(e)) + "," for e in events)
+        else:
+            lines = [json.dumps(e) for e in events]
+        self.started = True
+        with open(self.path, "a") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def _process_name_event(self):
+        return {"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": self.process}}
+
+    def close(self):
+        self.flush()
+
+
+def chrome_event(event):
+    # Chrome's trace viewer (chrome://tracing, Perfetto) "complete" event.
+    args = dict(event.get("attrs") or {})
+    args["trace_id"] = event["trace_id"]
+    args["thread"] = event.get("thread")
+    return {
+        "name": event["name"],
+        "cat": event["process"],
+        "ph": "X",
+        "ts": round(event["start"] * 1e6),
+        "dur": round(event["duration_ms"] * 1000),
+        "pid": event["pid"],
+        "tid": event.get("tid", 0),
+        "args": args,
+    }
+
+
+def read_events(path):
+    # Reads spans back from either format.
+    with open(path, "r") as f:
+        text = f.read().strip()
+    if not text:
+        return []
+    if not text.startswith("["):
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    # The Chrome array format may be left unterminated by a live process.
+    text = text.rstrip(",")
+    if not text.endswith("]"):
+        text += "]"
+    events = []
+    for e in json.loads(text):
+        if e.get("ph") != "X":
+            continue
+        args = dict(e.get("args") or {})
+        events.append({
+            "trace_id": args.pop("trace_id", None),
+            "name": e["name"],
+            "process": e.get("cat"),
+            "pid": e.get("pid"),
+            "tid": e.get("tid"),
+            "thread": args.pop("thread", None),
+            "start": e["ts"] / 1e6,
+            "duration_ms": e["dur"] / 1000,
+            "attrs": args,
+        })
+    return events
+
+
+def trace_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith((".trace.jsonl", ".trace.json")):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def breakdown(events):
+    # Per trace: stage durations in order of start time, and the total span
+    # from the first stage starting to the last one ending.
+    traces = {}
+    for event in events:
+        if event.get("trace_id"):
+            traces.setdefault(event["trace_id"], []).append(event)
+
+    report = {}
+    for trace_id, spans in traces.items():
+        spans.sort(key=lambda e: e["start"])
+        first = spans[0]["start"]
+        last = max(e["start"] + e["duration_ms"] / 1000 for e in spans)
+        report[trace_id] = {
+            "start": first,
+            "total_ms": round((last - first) * 1000, 3),
+            "stages": [
+                {"name": e["name"], "offset_ms": round((e["start"] - first) * 1000, 3),
+                 "duration_ms": e["duration_ms"]}
+                for e in spans
+            ],
+        }
+    return report
+
+
+def stage_summary(events):
+    stages = {}
+    for event in events:
+        stages.setdefault(event["name"], []).append(event["duration_ms"])
+    summary = {}
+    for name, durations in sorted(stages.items()):
+        durations.sort()
+        summary[name] = {
+            "count": len(durations),
+            "mean_ms": round(sum(durations) / len(durations), 3),
+            "p50_ms": durations[len(durations) // 2],
+            "p95_ms": durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+            "max_ms": durations[-1],
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect ROSbot VLA trace files")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    report = subparsers.add_parser("report", help="Per-stage latency breakdown of every trace")
+    report.add_argument("paths", nargs="+", help="Trace files or directories")
+    report.add_argument("--last", type=int, default=10, help="Number of most recent traces to show")
+
+    merge = subparsers.add_parser("merge", help="Combine trace files into one Chrome trace")
+    merge.add_argument("paths", nargs="+", help="Trace files or directories")
+    merge.add_argument("--output", required=True)
+
+    args = parser.parse_args()
+    events = [e for path in trace_files(args.paths) for e in read_events(path)]
+
+    if args.command == "merge":
+        names = {e["pid"]: e["process"] for e in events}
+        trace_events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": name}}
+                        for pid, name in names.items()]
+        trace_events.extend(chrome_event(e) for e in events)
+        with open(args.output, "w") as f:
+            json.dump({"traceEvents": trace_events}, f)
+        print(f"Wrote {len(events)} spans to {args.output}")
+        return
+
+    traces = sorted(breakdown(events).items(), key=lambda item: item[1]["start"])
+    print(json.dumps({
+        "stages": stage_summary(events),
+        "traces": dict(traces[-args.last:]) if args.last > 0 else {},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+# wsgi.py
+# Production entry point for the VLA server. `python wsgi.py` serves it with
+# gunicorn and gunicorn.conf.py, or with waitress where gunicorn is not
+# available (Windows). `python main.py` remains Flask's development server.
+import os
+import sys
+
+
+def serve():
+    # The main module is not imported here: gunicorn's workers import it
+    # after forking, so each builds its own backend and scheduler threads.
+    try:
+        from gunicorn.app.wsgiapp import run
+    except ImportError:
+        run = None
+    if run is not None:
+        config = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn.conf.py")
+        sys.argv = [sys.argv[0], "-c", config, "wsgi:app"] + sys.argv[1:]
+        run()
+        return
+
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        sys.exit("Install gunicorn or waitress to serve in production, or run main.py for the development server")
+
+    from main import app, backend
+    if os.environ.get("VLA_WARM_UP", "1") != "0":
+        backend.warm_up_async()
+    host, _, port = os.environ.get("VLA_BIND", "0.0.0.0:5000").rpartition(":")
+    waitress_serve(app, host=host or "0.0.0.0", port=int(port), threads=int(os.environ.get("VLA_THREADS", 16)))
+
+
+if __name__ == "__main__":
+    serve()
+else:
+    from main import app